@@ -0,0 +1,79 @@
+import threading
+
+
+class AllowanceLedger:
+    """ประมาณ allowance ของแต่ละ address ในเครื่อง แทนการเรียก allowance() ทุกครั้งที่ซื้อ
+
+    seed จาก chain ครั้งเดียว → หักตาม totalCost ของ EnergyPaid ที่ยืนยันแล้ว
+    → ถาม chain ใหม่เมื่อค่าประมาณต่ำกว่าที่ต้องใช้ หรือหลังจ่ายเงินล้มเหลว
+    approve ที่ส่งแล้วแต่ยังไม่ถูก mine (expect) นับว่าพอแล้ว → ไม่ถาม chain (ซึ่งยังเห็นค่าเก่า) แล้ว approve ซ้ำ
+    """
+
+    def __init__(self, token_contract, spender):
+        self.token_contract = token_contract
+        self.spender = spender
+        self._allowances = {}
+        self._pending = {}  # addr → จำนวนที่ approve ไว้ใน tx ที่ยังไม่ถูก mine
+        self._lock = threading.Lock()
+
+    def estimate(self, addr):
+        with self._lock:
+            return self._allowances.get(addr)
+
+    def _covered(self, addr, amount):
+        with self._lock:
+            pending = self._pending.get(addr)
+            estimate = self._allowances.get(addr)
+        return (pending is not None and pending >= amount) or (estimate is not None and estimate >= amount)
+
+    def refresh(self, addr):
+        allowance = self.token_contract.functions.allowance(addr, self.spender).call()
+        with self._lock:
+            self._allowances[addr] = allowance
+        return allowance
+
+    def has_at_least(self, addr, amount):
+        """True ถ้า allowance (หรือ approve ที่รออยู่) พอ (RPC เฉพาะตอนยังไม่มีค่า หรือค่าประมาณต่ำกว่า amount)"""
+        if self._covered(addr, amount):
+            return True
+        return self.refresh(addr) >= amount
+
+    async def has_at_least_async(self, addr, amount, async_token_contract):
+        """has_at_least สำหรับ event loop: อ่าน allowance ผ่าน contract ของ async_web3"""
+        if self._covered(addr, amount):
+            return True
+        allowance = await async_token_contract.functions.allowance(addr, self.spender).call()
+        self.set(addr, allowance)
+        return allowance >= amount
+
+    def expect(self, addr, amount):
+        """กำลังส่ง approve amount → has_at_least ถือว่าพอจนกว่าจะ settle"""
+        with self._lock:
+            self._pending[addr] = amount
+
+    def approving(self, addr):
+        """มี approve ของ addr ที่ยังไม่ถูก mine (eth_call ยังเห็น allowance เดิม)"""
+        with self._lock:
+            return addr in self._pending
+
+    def settle(self, addr, amount=None):
+        """approve จบแล้ว: amount = allowance หลัง approve สำเร็จ, None = ล้มเหลว (ถาม chain ใหม่ครั้งหน้า)"""
+        with self._lock:
+            self._pending.pop(addr, None)
+            if amount is None:
+                self._allowances.pop(addr, None)
+            else:
+                self._allowances[addr] = amount
+
+    def set(self, addr, amount):
+        with self._lock:
+            self._allowances[addr] = amount
+
+    def debit(self, addr, amount):
+        with self._lock:
+            if addr in self._allowances:
+                self._allowances[addr] = max(self._allowances[addr] - amount, 0)
+
+    def invalidate(self, addr):
+        with self._lock:
+            self._allowances.pop(addr, None)
@@ -0,0 +1,59 @@
+"""ลายเซ็น EIP-712 ของรายงานพลังงาน (EnergyReport) สำหรับ EnergyMarket.batchReport
+
+บ้านเซ็น (house, generated, consumed, interval, nonce) ด้วย private key ของตัวเองนอก chain
+relayer ตรวจลายเซ็นก่อนรวมเข้า batch และสัญญาตรวจซ้ำอีกรอบตอนใช้ค่า
+domain ผูกกับ chain id + address ของ EnergyMarket → ลายเซ็นใช้ข้าม chain / ข้ามสัญญาไม่ได้
+"""
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+
+from config import CHAIN_ID, MARKET_ADDRESS
+
+DOMAIN_NAME = "EnergyMarket"
+DOMAIN_VERSION = "1"
+
+REPORT_TYPES = {
+    "EnergyReport": [
+        {"name": "house", "type": "address"},
+        {"name": "generated", "type": "uint256"},
+        {"name": "consumed", "type": "uint256"},
+        {"name": "interval", "type": "uint256"},
+        {"name": "nonce", "type": "uint256"},
+    ]
+}
+REPORT_FIELDS = tuple(field["name"] for field in REPORT_TYPES["EnergyReport"])
+
+
+def domain(chain_id=CHAIN_ID, market_address=MARKET_ADDRESS):
+    return {
+        "name": DOMAIN_NAME,
+        "version": DOMAIN_VERSION,
+        "chainId": chain_id,
+        "verifyingContract": market_address,
+    }
+
+
+def make_report(house, generated, consumed, interval, nonce):
+    return {
+        "house": house,
+        "generated": int(generated),
+        "consumed": int(consumed),
+        "interval": int(interval),
+        "nonce": int(nonce),
+    }
+
+
+def sign_report(pk, report):
+    """ลายเซ็น (hex 65 byte) ของ report ด้วย private key ของบ้าน"""
+    signed = Account.sign_typed_data(pk, domain(), REPORT_TYPES, report)
+    return signed.signature.to_0x_hex()
+
+
+def recover_signer(report, signature):
+    """address ที่เซ็น report นี้ (ต้องตรงกับ report["house"] ถึงจะใช้ได้)"""
+    return Account.recover_message(encode_typed_data(domain(), REPORT_TYPES, report), signature=signature)
+
+
+def as_tuple(report):
+    """report → tuple ตามลำดับ field ของ struct EnergyReport (สำหรับ encode เป็น argument ของ batchReport)"""
+    return tuple(report[name] for name in REPORT_FIELDS)
@@ -0,0 +1,231 @@
+"""benchmark: gas ของ EnergyMarket ตามจำนวนบ้านที่ลงทะเบียน บน EVM จำลอง (eth-tester + py-evm)
+
+    python bench/market_gas.py [--households 7,50,100,250,500,1000] [--sellers 3]
+                               [--out ไฟล์.json] [--compare ผลเก่า.json] [--source <commit>|ไฟล์.sol]
+
+ตาราง before/after ของการแก้ sol.sol (ต้องมี solc):
+    python bench/market_gas.py --source <commit ก่อนแก้> --out before.json
+    python bench/market_gas.py --compare before.json
+
+gas ของ function ต้องไม่โตตามจำนวนบ้าน (exit 1 ถ้าโตเกิน --tolerance):
+    python bench/market_gas.py --households 7,1000 --flat payEnergy
+
+บ้านที่ active มีแค่ผู้ขาย --sellers หลัง + ผู้ซื้อ 1 หลัง ที่เหลือลงทะเบียนไว้เฉยๆ (ยังไม่เคยรายงาน)
+แต่ละขนาด: ผู้ขายรายงานค่าใหม่ → ผู้ซื้อรายงาน + payEnergy → กวาดรายได้ผู้ขายทุกราย (claimFor)
+→ ผู้ขาย 1 หลัง resetEnergy (ออกจาก activeSellers) แล้วรายงานกลับ (เข้า set ใหม่ = คอลัมน์ reportJoin)
+reportEnergy = รายงานซ้ำของผู้ขายที่อยู่ใน set แล้ว → ผลต่างกับ reportJoin / resetEnergy คือค่าดูแล set
+gas ที่ได้มาจาก receipt จริง → บันทึกเป็น JSON ไว้เทียบระหว่าง commit (--compare)
+พร้อม compiler + digest ของ sol.sol ที่ compile มา
+bytecode ที่ไม่ได้มาจาก solc (เช่น artifact จำลองใน LOCAL_ARTIFACTS) → ไม่วัด เว้นแต่สั่ง --allow-non-solc
+(ตัวเลขแบบนั้นไม่ใช่ gas ของ sol.sol และไม่ถูกบันทึกลง bench/results)
+--source วัด sol.sol ของ commit อื่น (compile แยกแคช) → function ที่ contract รุ่นนั้นไม่มีจะเป็น "-"
+พร้อมขนาดของ activeSellers (บ้านที่การกวาดรายได้ต้องไล่) เทียบกับบ้านทั้งหมด
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from eth_account import Account
+from eth_utils import keccak
+
+import local_chain
+
+FUNCTIONS = ("reportEnergy", "reportJoin", "payEnergy", "resetEnergy", "claimFor")
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+# เพดานราคาที่ผู้ซื้อส่งให้ payEnergy (ค่าเริ่มต้นเดียวกับ config.PAY_MAX_PRICE)
+MAX_PRICE = 2 * 10**15
+
+
+def _account(tag, i):
+    return Account.from_key(keccak(text=f"keyes-gas-{tag}-{i}"))
+
+
+def _send(chain, fn, sender):
+    tx_hash = fn.transact({"from": sender})
+    receipt = chain.web3.eth.wait_for_transaction_receipt(tx_hash)
+    if receipt["status"] != 1:
+        raise RuntimeError(f"{fn.fn_name} revert (tx {tx_hash.hex()})")
+    return receipt["gasUsed"]
+
+
+def resolve_source(spec):
+    """(ไฟล์ sol.sol, ไฟล์แคช artifact) ของ --source: path ของไฟล์ หรือ commit ที่อ่านด้วย git show"""
+    if spec is None:
+        return local_chain.CONTRACT_SOURCE, local_chain.ARTIFACTS_PATH
+    tag = "".join(c if c.isalnum() else "_" for c in spec)
+    cache = os.path.join(os.path.dirname(local_chain.ARTIFACTS_PATH), f"contracts-{tag}.json")
+    if os.path.isfile(spec):
+        return spec, cache
+    source = subprocess.run(
+        ["git", "show", f"{spec}:sol.sol"], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    path = os.path.join(RESULTS_DIR, f"sol-{tag}.sol")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(source)
+    return path, cache
+
+
+def setup(sellers, source_path=local_chain.CONTRACT_SOURCE, artifacts_path=local_chain.ARTIFACTS_PATH):
+    """chain ใหม่ที่มีผู้ขาย + ผู้ซื้อ 1 หลัง (unlock ไว้ใน eth-tester จะได้ส่ง tx ในนามบ้านได้เลย)"""
+    chain = local_chain.LocalChain(households=[], source_path=source_path, artifacts_path=artifacts_path)
+    active = [(f"seller{i}", _account("seller", i), "SELL_ONLY") for i in range(sellers)]
+    active.append(("buyer", _account("buyer", 0), "BUY_ONLY"))
+    chain.add_households([(name, acct.address, role) for name, acct, role in active], verbose=False)
+    for _, acct, _ in active:
+        chain.tester.add_account(acct.key.to_0x_hex())
+
+    buyer = active[-1][1].address
+    chain.token.functions.approve(chain.market.address, 10**27).transact({"from": buyer})
+    return chain, [acct.address for _, acct, _ in active[:-1]], buyer
+
+
+def register_idle(chain, start, count):
+    for i in range(start, start + count):
+        chain.market.functions.registerHousehold(_account("idle", i).address, local_chain.ROLES["PROSUMER"]).transact()
+
+
+def _inputs(chain, name):
+    """จำนวน argument ของ function ใน contract รุ่นที่ deploy (None = ไม่มี function นี้)"""
+    for item in chain.market.abi:
+        if item.get("type") == "function" and item["name"] == name:
+            return len(item["inputs"])
+    return None
+
+
+def measure(chain, sellers, buyer, round_no):
+    market = chain.market.functions
+    gas = {}
+    for i, seller in enumerate(sellers):
+        gas["reportEnergy"] = _send(chain, market.reportEnergy(100 + round_no + i, 10), seller)
+    _send(chain, market.reportEnergy(0, 50), buyer)
+    # ก่อนมี maxPricePerKwh → payEnergy(buyer, kwh)
+    pay_args = (buyer, 50, MAX_PRICE) if _inputs(chain, "payEnergy") == 3 else (buyer, 50)
+    gas["payEnergy"] = _send(chain, market.payEnergy(*pay_args), buyer)
+    if _inputs(chain, "claimFor") is not None:
+        gas["claimFor"] = _send(chain, market.claimFor(sellers), buyer)
+    # รายได้ถูกกวาดไปแล้ว → reset ทำให้ surplus เป็น 0 และออกจาก activeSellers, รายงานกลับ = เข้า set ใหม่
+    gas["resetEnergy"] = _send(chain, market.resetEnergy(), sellers[0])
+    gas["reportJoin"] = _send(chain, market.reportEnergy(100, 10), sellers[0])
+    return gas
+
+
+def compare(old, new):
+    old_stages = {s["households"]: s["gas"] for s in old["stages"]}
+    print(f"\n📊 เทียบกับ {old['meta'].get('commit', '?')}")
+    if old["meta"].get("compiler") != new["meta"].get("compiler"):
+        print(f"⚠️ compile ต่างกัน ({old['meta'].get('compiler')} → {new['meta'].get('compiler')}) → เทียบกันตรงๆ ไม่ได้")
+    print(f"{'บ้าน':>6}" + "".join(f"{fn:>28}" for fn in FUNCTIONS))
+    for s in new["stages"]:
+        o = old_stages.get(s["households"])
+        if not o:
+            continue
+        cells = []
+        for fn in FUNCTIONS:
+            before, after = o.get(fn), s["gas"].get(fn)
+            if before is None or after is None:
+                cells.append(f"{'-':>28}")
+            else:
+                cells.append(f"{before:>9} → {after:<9}({(after - before) / before:+.1%})".rjust(28))
+        print(f"{s['households']:>6}" + "".join(cells))
+
+
+def check_flat(stages, functions, tolerance):
+    """gas ของขนาดใหญ่สุดเทียบขนาดเล็กสุด → True ถ้าทุก function โตไม่เกิน tolerance"""
+    first, last = stages[0], stages[-1]
+    ok = True
+    print(f"\n📏 gas ที่ {first['households']} → {last['households']} บ้าน (ยอมให้ต่างได้ {tolerance:.1%})")
+    for fn in functions:
+        before, after = first["gas"].get(fn), last["gas"].get(fn)
+        if before is None or after is None:
+            print(f"  {fn}: ไม่มีใน contract รุ่นนี้")
+            ok = False
+            continue
+        growth = (after - before) / before
+        flat = abs(growth) <= tolerance
+        ok = ok and flat
+        print(f"  {'✅' if flat else '❌'} {fn}: {before} → {after} ({growth:+.2%})")
+    return ok
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gas ของ EnergyMarket ตามจำนวนบ้าน")
+    parser.add_argument("--households", default="7,50,100,250,500,1000", help="จำนวนบ้านทั้งหมด (คั่นด้วย comma)")
+    parser.add_argument("--sellers", type=int, default=3)
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    parser.add_argument("--source", help="วัด sol.sol ของ commit นี้ (หรือไฟล์ .sol) แทนของ working tree")
+    parser.add_argument("--allow-non-solc", action="store_true",
+                        help="ยอมวัด bytecode ที่ไม่ได้มาจาก solc (ลองโค้ด benchmark เท่านั้น)")
+    parser.add_argument("--flat", default="", help="function ที่ gas ต้องไม่โตตามจำนวนบ้าน (คั่นด้วย comma)")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    source_path, artifacts_path = resolve_source(args.source)
+    chain, sellers, buyer = setup(args.sellers, source_path, artifacts_path)
+    info = local_chain.artifacts_info(artifacts_path)
+    compiler = info["compiler"]
+    from_solc = (compiler or "").startswith("solc")
+    if not from_solc:
+        if not args.allow_non_solc:
+            sys.exit(f"❌ bytecode ไม่ได้มาจาก solc ({compiler}) → ไม่ใช่ gas ของ sol.sol ไม่วัด "
+                     f"(ลบ {artifacts_path} ให้ compile ใหม่ด้วย py-solc-x หรือสั่ง --allow-non-solc)")
+        print(f"⚠️ bytecode ไม่ได้มาจาก solc ({compiler}) → ตัวเลขไม่ใช่ gas ของ sol.sol")
+    registered = len(sellers) + 1
+    measure(chain, sellers, buyer, -1)  # รอบแรกเขียน storage จาก 0 (แพงกว่ารอบปกติ) → ไม่นับ
+    stages = []
+    print(f"{'บ้าน':>6}" + "".join(f"{fn:>14}" for fn in FUNCTIONS) + f"{'activeSellers':>15}")
+    for size in sorted(int(n) for n in args.households.split(",")):
+        if size > registered:
+            register_idle(chain, registered - len(sellers) - 1, size - registered)
+            registered = size
+        gas = measure(chain, sellers, buyer, len(stages))
+        active = chain.market.functions.activeSellerCount().call() if _inputs(chain, "activeSellerCount") is not None else None
+        stages.append({"households": registered, "gas": gas, "active_sellers": active})
+        print(f"{registered:>6}" + "".join(f"{gas.get(fn, '-'):>14}" for fn in FUNCTIONS) + f"{active if active is not None else '-':>15}")
+
+    commit = args.source or _commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sellers": args.sellers,
+            **info,
+        },
+        "stages": stages,
+    }
+    out = args.out
+    if out is None and from_solc:
+        out = os.path.join(RESULTS_DIR, f"market_gas-{commit}.json")
+    if out:
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"💾 บันทึกผลที่ {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+    flat = [fn for fn in args.flat.split(",") if fn]
+    if flat and not check_flat(stages, flat, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
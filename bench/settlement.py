@@ -0,0 +1,232 @@
+"""benchmark: settlement ของ N บ้าน × M รอบ บน chain จำลอง (KEYES_CHAIN=local)
+
+    python bench/settlement.py [--households 10,50,100] [--intervals 3] [--concurrency 16]
+                               [--out ไฟล์.json] [--compare ผลเก่า.json]
+
+แต่ละรอบ: ทุกบ้าน reportEnergy ก่อน แล้วบ้านที่ใช้ไฟเกินผลิตค่อย payEnergy
+ผ่าน helpers.report_energy / pay_energy (thread ละบ้าน เหมือน house_*.py หลายตัวรันพร้อมกัน)
+รอบแรกของแต่ละขนาดเป็น warm-up (approve + estimate_gas) ไม่นับผล
+
+ผลที่วัด: tx/s, latency ตั้งแต่ส่งจนได้ receipt (p50/p95/p99), จำนวน RPC ต่อ settlement
+และ gasUsed ต่อ function ตามจำนวนบ้าน → บันทึกเป็น JSON ไว้เทียบระหว่าง commit
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ["KEYES_CHAIN"] = "local"  # ต้องตั้งก่อน import config
+
+from eth_account import Account
+from eth_utils import keccak
+
+import config
+import helpers
+
+ROLE_CYCLE = ("SELL_ONLY", "PROSUMER", "BUY_ONLY")
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+# -------------------------------
+# บ้านจำลอง
+# -------------------------------
+def bench_households(start, count):
+    """บ้าน bench{i} แบบ deterministic (key จาก keccak) วน role ขาย / prosumer / ซื้อ"""
+    houses = []
+    for i in range(start, start + count):
+        acct = Account.from_key(keccak(text=f"keyes-bench-{i}"))
+        houses.append((f"bench{i}", acct, ROLE_CYCLE[i % len(ROLE_CYCLE)]))
+    return houses
+
+
+def meter(role, interval):
+    """(ผลิต, ใช้) ของรอบนี้ → ผู้ขายเหลือขาย, prosumer สลับขาย/ซื้อ, ผู้ซื้อใช้อย่างเดียว"""
+    if role == "SELL_ONLY":
+        return 50 + interval, 5
+    if role == "PROSUMER":
+        return (30, 10) if interval % 2 else (10, 25)
+    return 0, 40
+
+
+def _timed(results, fn, call, *args):
+    start = time.perf_counter()
+    receipt = call(*args)
+    results.append((fn, time.perf_counter() - start, receipt))
+
+
+def report(house, interval, results):
+    name, acct, role = house
+    gen, con = meter(role, interval)
+    _timed(results, "reportEnergy", helpers.report_energy, acct.address, acct.key, gen, con)
+
+
+def pay(house, interval, results):
+    name, acct, role = house
+    gen, con = meter(role, interval)
+    if con > gen:
+        _timed(results, "payEnergy", helpers.pay_energy, acct.address, acct.key, con - gen)
+
+
+# -------------------------------
+# สถิติ
+# -------------------------------
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+
+def latency_summary(latencies):
+    return {
+        "count": len(latencies),
+        **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+        "max_ms": round(max(latencies, default=0) * 1000, 2),
+    }
+
+
+def rpc_delta(before, after):
+    delta = {}
+    for method, s in after.items():
+        count = s["count"] - before.get(method, {}).get("count", 0)
+        if count:
+            delta[method] = count
+    return delta
+
+
+def run_stage(houses, intervals, concurrency):
+    results = []
+    before = config.rpc_stats.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for interval in range(1, intervals + 1):
+            # reportEnergy ทุกบ้านให้ถูก mine ก่อน แล้วค่อยซื้อ (ผลไม่ขึ้นกับลำดับ thread)
+            list(pool.map(lambda h: report(h, interval, results), houses))
+            list(pool.map(lambda h: pay(h, interval, results), houses))
+    elapsed = time.perf_counter() - start
+    rpc = rpc_delta(before, config.rpc_stats.snapshot())
+    return results, elapsed, rpc
+
+
+def summarize(households, bench_count, intervals, results, elapsed, rpc):
+    ok = [(fn, dt, r) for fn, dt, r in results if r is not None and r["status"] == 1]
+    by_fn = {}
+    for fn, dt, r in ok:
+        by_fn.setdefault(fn, {"latency": [], "gas": []})
+        by_fn[fn]["latency"].append(dt)
+        by_fn[fn]["gas"].append(r["gasUsed"])
+
+    settlements = bench_count * intervals
+    round_trips = sum(rpc.values())
+    return {
+        "households": households,
+        "bench_households": bench_count,
+        "intervals": intervals,
+        "settlements": settlements,
+        "txs": len(ok),
+        "failed": len(results) - len(ok),
+        "seconds": round(elapsed, 3),
+        "tx_per_s": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_summary([dt for _, dt, _ in ok]),
+        "latency_by_fn": {fn: latency_summary(v["latency"]) for fn, v in by_fn.items()},
+        "rpc_per_settlement": round(round_trips / settlements, 2) if settlements else 0.0,
+        "rpc_calls": rpc,
+        "gas_by_fn": {
+            fn: {"mean": sum(v["gas"]) // len(v["gas"]), "max": max(v["gas"])}
+            for fn, v in by_fn.items()
+        },
+    }
+
+
+# -------------------------------
+# เทียบกับผลเก่า
+# -------------------------------
+def compare(old, new):
+    old_stages = {s["bench_households"]: s for s in old["stages"]}
+    print(f"\n📊 เทียบกับ {old['meta'].get('commit', '?')}")
+    print(f"{'บ้าน':>6}{'tx/s เดิม':>12}{'tx/s ใหม่':>12}{'p95 เดิม':>12}{'p95 ใหม่':>12}{'rpc/settle':>14}")
+    for s in new["stages"]:
+        o = old_stages.get(s["bench_households"])
+        if not o:
+            continue
+        print(
+            f"{s['bench_households']:>6}{o['tx_per_s']:>12.1f}{s['tx_per_s']:>12.1f}"
+            f"{o['latency']['p95_ms']:>12.1f}{s['latency']['p95_ms']:>12.1f}"
+            f"{o['rpc_per_settlement']:>7.1f}→{s['rpc_per_settlement']:<6.1f}"
+        )
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="settlement throughput benchmark บน chain จำลอง")
+    parser.add_argument("--households", default="10,50,100", help="จำนวนบ้าน (คั่นด้วย comma, เรียงจากน้อยไปมาก)")
+    parser.add_argument("--intervals", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    parser.add_argument("--verbose", action="store_true", help="แสดง log ของ helpers ระหว่างรัน")
+    args = parser.parse_args()
+
+    sizes = sorted(int(n) for n in args.households.split(","))
+    commit = _commit()
+    meta = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "intervals": args.intervals,
+        "concurrency": args.concurrency,
+    }
+
+    houses = []
+    stages = []
+    for size in sizes:
+        new = bench_households(len(houses), size - len(houses))
+        config.local.add_households([(n, a.address, r) for n, a, r in new], verbose=False)
+        houses += new
+        helpers.gas_model.invalidate_count()
+        households = len(config.local.households)
+
+        log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with log:
+            run_stage(houses, 1, args.concurrency)  # warm-up
+            results, elapsed, rpc = run_stage(houses, args.intervals, args.concurrency)
+        stage = summarize(households, size, args.intervals, results, elapsed, rpc)
+        stages.append(stage)
+        print(
+            f"🏁 {size} บ้าน (ทั้งหมด {households}) × {args.intervals} รอบ → "
+            f"{stage['tx_per_s']} tx/s, p50 {stage['latency']['p50_ms']} ms, "
+            f"p95 {stage['latency']['p95_ms']} ms, p99 {stage['latency']['p99_ms']} ms, "
+            f"{stage['rpc_per_settlement']} RPC/settlement, gas {stage['gas_by_fn']}"
+            + (f", ล้มเหลว {stage['failed']}" if stage["failed"] else "")
+        )
+
+    result = {"meta": meta, "stages": stages}
+    out = args.out or os.path.join(RESULTS_DIR, f"settlement-{commit}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"💾 บันทึกผลที่ {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
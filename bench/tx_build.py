@@ -0,0 +1,66 @@
+"""microbenchmark: build + sign tx ด้วย web3 build_transaction เทียบกับ fast_tx
+
+    python bench/tx_build.py [จำนวนรอบ]
+
+ไม่ยิง RPC (ใส่ gas / nonce / chainId / gasPrice ครบ web3 จึงไม่ต้อง estimate; config ต่อ chain เฉพาะตอนใช้จริง)
+เวลา sign ขึ้นกับ backend ของ eth-keys: ติดตั้ง coincurve จะเร็วกว่าแบบ pure Python ราว 10 เท่า
+"""
+import os
+import sys
+import time
+
+from eth_account import Account
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHAIN_ID, market_contract
+from fast_tx import ContractCalls, sign_tx
+
+FEES = {"gasPrice": 2 * 10**9}
+
+
+def bench(label, fn, n):
+    fn(0)  # warm up
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32}{elapsed / n * 1e6:>10.1f} µs/tx")
+    return elapsed / n
+
+
+def main(n=2000):
+    acct = Account.create()
+    pk = acct.key
+    market = market_contract
+    calls = ContractCalls(market.address, market.abi)
+
+    def web3_path(i):
+        tx = market.functions.reportEnergy(i, 7).build_transaction({
+            "chainId": CHAIN_ID, "gas": 150000, "nonce": i, **FEES
+        })
+        return Account.sign_transaction(tx, pk).raw_transaction
+
+    def fast_path(i):
+        return sign_tx(calls.reportEnergy(i, 7), pk, CHAIN_ID, i, 150000, FEES)
+
+    # ต้องได้ tx เดียวกันทุก byte
+    assert web3_path(5) == fast_path(5)
+
+    def web3_build_only(i):
+        return market.functions.reportEnergy(i, 7).build_transaction({
+            "chainId": CHAIN_ID, "gas": 150000, "nonce": i, **FEES
+        })
+
+    def fast_build_only(i):
+        return calls.reportEnergy(i, 7)
+
+    print(f"reportEnergy × {n}")
+    a = bench("web3 build_transaction", web3_build_only, n)
+    b = bench("fast_tx calldata template", fast_build_only, n)
+    c = bench("web3 build + sign", web3_path, n)
+    d = bench("fast_tx build + sign", fast_path, n)
+    print(f"build เร็วขึ้น {a / b:.1f}x, build + sign เร็วขึ้น {c / d:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -1,21 +1,120 @@
 import os
-from web3 import Web3
+import atexit
+import tempfile
+from web3 import Web3, AsyncWeb3
 from dotenv import load_dotenv
+from rpc_batch import ReadBatch
+from rpc_failover import FailoverProvider, AsyncFailoverProvider
+from read_cache import BlockReadCache
+from connection import Lazy, ConnectionMonitor
 
 load_dotenv()
 
 #RPC_URL = "https://ethereum-holesky-rpc.publicnode.com"
 RPC_URL = "https://ethereum-hoodi-rpc.publicnode.com"
+# หลาย endpoint คั่นด้วย comma → read ไป node ที่เร็วสุด, ล่มแล้วย้ายอัตโนมัติ
+RPC_URLS = [u.strip() for u in os.getenv("RPC_URLS", RPC_URL).split(",") if u.strip()]
 
 #CHAIN_ID = 17000
 CHAIN_ID = 560048
 
-web3 = Web3(Web3.HTTPProvider(RPC_URL))
-if not web3.is_connected():
-    raise Exception("❌ เชื่อมต่อ Hoodi ไม่ได้")
+# KEYES_CHAIN=local → ใช้ chain จำลองในเครื่อง (ดู local_chain.py) แทน Hoodi
+KEYES_CHAIN = os.getenv("KEYES_CHAIN", "hoodi")
+local_deployment = None
+local = None
+if KEYES_CHAIN == "local":
+    import local_chain
+    # มี `python local_chain.py` รันอยู่ → ต่อเข้า node นั้น (ทุก process เห็น chain เดียวกัน)
+    local_deployment = local_chain.running_node()
+    if local_deployment:
+        RPC_URLS = [local_deployment["rpc_url"]]
+    else:
+        local = local_chain.LocalChain()
+        local_deployment = local.deployment()
+    CHAIN_ID = local_deployment["chain_id"]
+
+# ค่า gas: "legacy" (gasPrice * 1.2) หรือ "eip1559" (จาก eth_feeHistory)
+GAS_MODE = os.getenv("GAS_MODE", "legacy")
+GAS_TTL = float(os.getenv("GAS_TTL", "30"))  # วินาที
+# gas oracle refresh เบื้องหลัง: 1 = ทุก block ใหม่ (ค่าไม่หมดอายุตาม TTL), 0 = ทุก GAS_TTL วินาที
+GAS_ON_NEW_BLOCK = os.getenv("GAS_ON_NEW_BLOCK", "0") == "1"
+
+# replace-by-fee: tx ที่ค้างเกิน RBF_STUCK_AFTER วินาที → ส่งแทนด้วย fee * RBF_BUMP (ไม่เกิน RBF_MAX_FEE_GWEI)
+RBF_STUCK_AFTER = float(os.getenv("RBF_STUCK_AFTER", "90"))
+RBF_BUMP = float(os.getenv("RBF_BUMP", "1.125"))
+RBF_MAX_FEE_GWEI = float(os.getenv("RBF_MAX_FEE_GWEI", "100"))
+
+# จำลอง payEnergy ด้วย eth_call ก่อนส่งจริง (ไม่มีผู้ขาย → ข้ามการซื้อ ไม่เสีย gas)
+PAY_PREFLIGHT = os.getenv("PAY_PREFLIGHT", "1") == "1"
+# ราคาเฉลี่ยสูงสุดที่ยอมจ่าย (wei ต่อหน่วย, 1 หน่วย = 1 Wh) ค่าเริ่มต้น 2 PALM ต่อ kWh
+# ผู้ขายตั้งราคาแพงกว่านี้ → payEnergy revert PriceTooHigh แทนการดึงเงินตามราคาใหม่
+PAY_MAX_PRICE = int(os.getenv("PAY_MAX_PRICE", str(2 * 10**15)))
+
+# รายได้ผู้ขายค้างอยู่ใน EnergyMarket จนกว่าจะ claim → sweep_earnings กวาดทีละ CLAIM_BATCH บ้านต่อ tx
+# ข้ามบ้านที่ยอดค้างน้อยกว่า CLAIM_MIN_PALM (ไม่คุ้มค่า gas)
+CLAIM_BATCH = int(os.getenv("CLAIM_BATCH", "50"))
+CLAIM_MIN_PALM = float(os.getenv("CLAIM_MIN_PALM", "0"))
+
+# REPORT_RELAYER=host:port → บ้านเซ็นรายงาน (EIP-712) ส่งให้ relayer.py รวมเป็น batchReport tx เดียว
+# ว่าง = แต่ละบ้านส่ง reportEnergy เอง; relayer รวมรายงานทุก RELAYER_BATCH_WINDOW วินาที หรือครบ RELAYER_MAX_BATCH
+REPORT_RELAYER = os.getenv("REPORT_RELAYER", "")
+RELAYER_BATCH_WINDOW = float(os.getenv("RELAYER_BATCH_WINDOW", "5"))
+RELAYER_MAX_BATCH = int(os.getenv("RELAYER_MAX_BATCH", "50"))
+
+# connection pool ใช้ร่วมกันทุก thread (dashboard + house loop)
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "20"))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "10"))  # วินาที
+RPC_RETRIES = int(os.getenv("RPC_RETRIES", "2"))  # retry เฉพาะ read
+RPC_HEALTH_INTERVAL = float(os.getenv("RPC_HEALTH_INTERVAL", "30"))  # วินาที
+
+# จำกัด request/วินาที ต่อ RPC host รวมทุก process ในเครื่อง (บ้าน + dashboard ใช้ถังเดียวกัน, 0 = ไม่จำกัด)
+# batch นับตามจำนวน request ข้างใน, read ที่ซ้ำกันพร้อมกันใน process เดียวถูกรวมเป็น request เดียว
+RPC_RATE = float(os.getenv("RPC_RATE", "0" if KEYES_CHAIN == "local" else "20"))
+RPC_BURST = int(os.getenv("RPC_BURST", "40"))
+RPC_LIMIT_DIR = os.getenv("RPC_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "keyes_rpc"))
+# read_cache ถาม block ล่าสุดเบื้องหลังทุก READ_CACHE_POLL วินาที (ไม่ต้องถามก่อน view call)
+READ_CACHE_POLL = float(os.getenv("READ_CACHE_POLL", "2"))
+
+
+
+def _make_provider():
+    if local:
+        return local.provider
+    provider = FailoverProvider(
+        RPC_URLS,
+        health_interval=RPC_HEALTH_INTERVAL,
+        pool_size=RPC_POOL_SIZE,
+        timeout=RPC_TIMEOUT,
+        retries=RPC_RETRIES,
+        rate=RPC_RATE,
+        burst=RPC_BURST,
+        limit_dir=RPC_LIMIT_DIR,
+    )
+    # endpoint เดียวก็ต้องเช็ค: node ที่ถูกพักหลัง error จะกลับมาใช้ได้ก็ต่อเมื่อ health check ผ่าน
+    provider.start()
+    return provider
+
+
+# import config ไม่ต่อ RPC และไม่ล้มถ้า RPC ล่ม → provider / contract สร้างตอนใช้ครั้งแรก (ดู connection.py)
+web3 = Lazy(lambda: Web3(_make_provider()), "web3")
+rpc_stats = Lazy(lambda: web3.provider.stats, "rpc_stats")
+# view call ซ้ำใน block เดียวกัน → RPC ครั้งเดียว (ใช้ read_cache.call(fn) แทน fn.call())
+read_cache = BlockReadCache(web3)
+read_cache.start(poll_interval=READ_CACHE_POLL)
+atexit.register(read_cache.stop)
+
+# เช็คการเชื่อมต่อเบื้องหลัง: ต่อไม่ได้ → โหมด degraded (monitor.available() เป็น False)
+monitor = ConnectionMonitor(web3, interval=RPC_HEALTH_INTERVAL, name="chain จำลอง" if local else "Hoodi")
+if local:
+    monitor.check()  # chain อยู่ใน process เดียวกัน ไม่มีทางล่ม
+else:
+    monitor.start()
 
 TOKEN_ADDRESS = os.getenv("TOKEN_ADDRESS")
 MARKET_ADDRESS = os.getenv("MARKET_ADDRESS")
+if local_deployment:
+    TOKEN_ADDRESS = local_deployment["token_address"]
+    MARKET_ADDRESS = local_deployment["market_address"]
 
 TOKEN_ABI = [
     {
@@ -38,6 +137,23 @@ TOKEN_ABI = [
         "outputs": [{"name": "", "type": "uint256"}],
         "type": "function"
     },
+    {
+        "constant": True,
+        "inputs": [{"name": "account", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": False, "name": "value", "type": "uint256"}
+        ],
+        "name": "Transfer",
+        "type": "event"
+    },
 ]
 
 MARKET_ABI = [
@@ -55,7 +171,8 @@ MARKET_ABI = [
     {
         "inputs": [
             {"internalType": "address", "name": "buyer", "type": "address"},
-            {"internalType": "uint256", "name": "kwhRequested", "type": "uint256"}
+            {"internalType": "uint256", "name": "kwhRequested", "type": "uint256"},
+            {"internalType": "uint256", "name": "maxPricePerKwh", "type": "uint256"}
         ],
         "name": "payEnergy",
         "outputs": [],
@@ -79,6 +196,43 @@ MARKET_ABI = [
         "stateMutability": "nonpayable",
         "type": "function"
     },
+    {
+        "inputs": [],
+        "name": "claim",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "address[]", "name": "houses", "type": "address[]"}
+        ],
+        "name": "claimFor",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "house", "type": "address"},
+                    {"internalType": "uint256", "name": "generated", "type": "uint256"},
+                    {"internalType": "uint256", "name": "consumed", "type": "uint256"},
+                    {"internalType": "uint256", "name": "interval", "type": "uint256"},
+                    {"internalType": "uint256", "name": "nonce", "type": "uint256"}
+                ],
+                "internalType": "struct EnergyMarket.EnergyReport[]",
+                "name": "reports",
+                "type": "tuple[]"
+            },
+            {"internalType": "bytes[]", "name": "sigs", "type": "bytes[]"}
+        ],
+        "name": "batchReport",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
 
     # --- Read Functions ---
     {
@@ -113,8 +267,150 @@ MARKET_ABI = [
         ],
         "stateMutability": "view",
         "type": "function"
-    }
+    },
+    {
+        "inputs": [],
+        "name": "activeSellers",
+        "outputs": [
+            {"internalType": "address[]", "name": "", "type": "address[]"}
+        ],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "activeSellerCount",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "totalSurplus",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "totalSurplusValue",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "house", "type": "address"}
+        ],
+        "name": "claimable",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "", "type": "address"}
+        ],
+        "name": "reportNonces",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+
+    # --- Events ---
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "user", "type": "address"},
+            {"indexed": False, "internalType": "uint8", "name": "role", "type": "uint8"}
+        ],
+        "name": "HouseholdRegistered",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "user", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "generated", "type": "uint256"},
+            {"indexed": False, "internalType": "uint256", "name": "consumed", "type": "uint256"}
+        ],
+        "name": "EnergyReported",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "user", "type": "address"}
+        ],
+        "name": "EnergyReset",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "buyer", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "kwh", "type": "uint256"},
+            {"indexed": False, "internalType": "uint256", "name": "pricePerKwh", "type": "uint256"},
+            {"indexed": False, "internalType": "uint256", "name": "totalCost", "type": "uint256"}
+        ],
+        "name": "EnergyPaid",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "house", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "Claimed",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "house", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "nonce", "type": "uint256"},
+            {"indexed": False, "internalType": "string", "name": "reason", "type": "string"}
+        ],
+        "name": "ReportRejected",
+        "type": "event"
+    },
+
+    # --- Errors (custom error ของ EnergyMarket → preflight แปลง selector เป็นชื่อ) ---
+    {"inputs": [], "name": "OnlyAdmin", "type": "error"},
+    {"inputs": [], "name": "AlreadyRegistered", "type": "error"},
+    {"inputs": [], "name": "NotRegistered", "type": "error"},
+    {"inputs": [], "name": "NotAllowed", "type": "error"},
+    {"inputs": [], "name": "BuyerNotRegistered", "type": "error"},
+    {"inputs": [], "name": "NotAllowedToBuy", "type": "error"},
+    {"inputs": [], "name": "NothingToBuy", "type": "error"},
+    {"inputs": [], "name": "NoSellersAvailable", "type": "error"},
+    {"inputs": [], "name": "PaymentFailed", "type": "error"},
+    {"inputs": [], "name": "LengthMismatch", "type": "error"},
+    {"inputs": [], "name": "ValueTooLarge", "type": "error"},
+    {"inputs": [], "name": "PriceTooHigh", "type": "error"}
 ]
 
-token_contract = web3.eth.contract(address=TOKEN_ADDRESS, abi=TOKEN_ABI)
-market_contract = web3.eth.contract(address=MARKET_ADDRESS, abi=MARKET_ABI)
+token_contract = Lazy(lambda: web3.eth.contract(address=TOKEN_ADDRESS, abi=TOKEN_ABI), "token_contract")
+market_contract = Lazy(lambda: web3.eth.contract(address=MARKET_ADDRESS, abi=MARKET_ABI), "market_contract")
+
+
+# สำหรับ helpers_async (event loop เดียวขับได้หลายร้อยบ้าน) → failover / สถิติ / node ประจำ address ชุดเดียวกับ web3
+def _make_async_web3():
+    if local:
+        return local.async_web3()
+    return AsyncWeb3(AsyncFailoverProvider(web3.provider, timeout=RPC_TIMEOUT, retries=RPC_RETRIES))
+
+
+async_web3 = Lazy(_make_async_web3, "async_web3")
+async_token_contract = Lazy(
+    lambda: async_web3.eth.contract(address=TOKEN_ADDRESS, abi=TOKEN_ABI), "async_token_contract"
+)
+async_market_contract = Lazy(
+    lambda: async_web3.eth.contract(address=MARKET_ADDRESS, abi=MARKET_ABI), "async_market_contract"
+)
+
+
+def batch_reads():
+    """รวม read ที่เกิดในรอบเดียวกันเป็น JSON-RPC batch เดียว (ดู rpc_batch.ReadBatch)"""
+    return ReadBatch(web3)
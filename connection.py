@@ -0,0 +1,146 @@
+"""ต่อ chain แบบ lazy + เฝ้าสถานะการเชื่อมต่อเบื้องหลัง
+
+import config ต้องไม่รอ network และไม่ล้มถ้า RPC ล่ม: provider / contract จึงสร้างตอนใช้ครั้งแรก (Lazy)
+ส่วน ConnectionMonitor เช็ค eth_blockNumber เป็นระยะ ถ้าต่อไม่ได้ → โหมด degraded
+(dashboard ยังแสดงประวัติจาก SQLite ได้, outbox เก็บ tx ไว้ส่งตอน RPC กลับมา)
+"""
+import time
+import threading
+
+
+class ChainUnavailable(Exception):
+    """ต่อ chain ไม่ได้ตอนนี้ (โหมด degraded)"""
+
+
+class Lazy:
+    """สร้าง object จริงตอนใช้ attribute ครั้งแรก (thread-safe) แล้วส่งต่อทุก attribute ไปที่ตัวจริง
+
+        web3 = Lazy(lambda: Web3(make_provider()), "web3")
+        web3.eth.block_number   # ← สร้าง Web3 ตรงนี้
+    """
+
+    def __init__(self, factory, name="lazy"):
+        self._lazy_factory = factory
+        self._lazy_name = name
+        self._lazy_target = None
+        self._lazy_lock = threading.Lock()
+
+    def lazy_target(self):
+        if self._lazy_target is None:
+            with self._lazy_lock:
+                if self._lazy_target is None:
+                    self._lazy_target = self._lazy_factory()
+        return self._lazy_target
+
+    @property
+    def lazy_ready(self):
+        return self._lazy_target is not None
+
+    def __getattr__(self, name):
+        if name.startswith("_lazy"):
+            raise AttributeError(name)
+        return getattr(self.lazy_target(), name)
+
+    def __repr__(self):
+        if self._lazy_target is None:
+            return f"<Lazy {self._lazy_name} (ยังไม่สร้าง)>"
+        return repr(self._lazy_target)
+
+
+class ConnectionMonitor:
+    """เช็คการเชื่อมต่อ chain เบื้องหลัง: ปกติทุก interval วินาที, ตอนล่มทุก retry_interval วินาที
+
+    connected = None (ยังไม่เคยเช็ค) / True / False → ใช้ available() หรือ require() ก่อนทำงานที่ต้องใช้ chain
+    """
+
+    def __init__(self, web3, interval=30, retry_interval=5, name="chain", stale_after=None):
+        self.web3 = web3
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.name = name
+        # thread เช็คอยู่แต่ไม่มีเช็คที่ผ่านนานเกินนี้ (เช่น RPC ค้างจน timeout) → ถือว่าต่อไม่ได้
+        self.stale_after = stale_after or 3 * interval
+
+        self.connected = None
+        self.block = None
+        self.last_ok = None
+        self.last_error = None
+        self.since = time.time()
+
+        self._up = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        try:
+            block = self.web3.eth.block_number
+        except Exception as e:
+            self._set(False, error=e)
+            return False
+        self._set(True, block=block)
+        return True
+
+    def _set(self, connected, block=None, error=None):
+        if connected:
+            self.block = block
+            self.last_ok = time.time()
+            self.last_error = None
+            self._up.set()
+        else:
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._up.clear()
+        if connected != self.connected:
+            if connected:
+                print(f"✅ เชื่อมต่อ {self.name} ได้ (block {block})")
+            else:
+                print(f"⚠️ เชื่อมต่อ {self.name} ไม่ได้ ({self.last_error}) → โหมด degraded ใช้ข้อมูลใน DB ไปก่อน")
+            self.connected = connected
+            self.since = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            ok = self.check()
+            self._stop.wait(self.interval if ok else self.retry_interval)
+
+    def start(self):
+        """เริ่ม thread เช็คการเชื่อมต่อ (ไม่ block ผู้เรียก)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stale(self):
+        """เช็คที่ผ่านล่าสุดเก่าเกิน stale_after (เช็คครั้งเดียวโดยไม่มี thread → ไม่มีวันเก่า)"""
+        if self._thread is None or self.last_ok is None:
+            return False
+        return time.time() - self.last_ok > self.stale_after
+
+    def available(self):
+        """True เฉพาะเมื่อเช็คล่าสุดผ่านและยังไม่เก่า (ยังไม่เคยเช็คผ่าน → False)"""
+        return self.connected is True and not self.stale()
+
+    def require(self):
+        if self.available():
+            return
+        if self.connected is None:
+            raise ChainUnavailable(f"ยังไม่ได้เช็คการเชื่อมต่อ {self.name}")
+        if self.connected and self.stale():
+            raise ChainUnavailable(f"{self.name} ไม่ตอบมาแล้ว {time.time() - self.last_ok:.0f}s")
+        raise ChainUnavailable(f"เชื่อมต่อ {self.name} ไม่ได้: {self.last_error}")
+
+    def wait(self, timeout=None):
+        """รอจนเชื่อมต่อได้ → True หรือ False ถ้าหมดเวลา"""
+        return self._up.wait(timeout)
+
+    def status(self):
+        return {
+            "connected": self.connected,
+            "block": self.block,
+            "last_ok": self.last_ok,
+            "last_error": self.last_error,
+            "since": self.since,
+        }
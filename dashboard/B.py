@@ -5,7 +5,7 @@ import sqlite3
 from dotenv import load_dotenv
 import minimalmodbus
 import threading
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, jsonify, render_template_string, request
 
 try:
     from flask_cors import CORS
@@ -15,8 +15,9 @@ except ImportError:
     CORS_AVAILABLE = False
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, reset_energy  # SELL_ONLY ไม่ต้องจ่าย pay_energy
-from config import web3, token_contract, market_contract
+from helpers import submit_report_energy, reset_energy, get_claimable, sweep_earnings  # SELL_ONLY ไม่ต้องจ่าย pay_energy
+from dashboard_guard import CLAIM_TOKEN, TOKEN_HEADER, READ_ONLY_CORS, post_allowed
+from config import web3, token_contract, market_contract, read_cache, monitor
 
 load_dotenv()
 
@@ -106,13 +107,15 @@ def init_baseline():
 # -------------------------------
 app = Flask(__name__)
 if CORS_AVAILABLE:
-    CORS(app)
+    # เปิดให้เว็บอื่นอ่านแค่ API ข้อมูล (หน้า / มี token ของ /api/claim)
+    CORS(app, resources=READ_ONLY_CORS)
 
 # Global variables to share data between threads
 current_data = {
     "total_generated": 0.0,
     "delta_generated": 0.0,
     "wallet_balance": 0.0,
+    "claimable": 0.0,
     "last_update": None,
 }
 
@@ -139,7 +142,7 @@ def get_wallet_balance():
         balance_contract = web3.eth.contract(address=token_address, abi=balance_abi)
 
         # ดึง balance จาก address ที่ได้จาก private key
-        balance_wei = balance_contract.functions.balanceOf(account.address).call()
+        balance_wei = read_cache.call(balance_contract.functions.balanceOf(account.address))
         balance_palm = balance_wei / (10**18)
 
         # แสดง log สำหรับการ debug
@@ -152,6 +155,15 @@ def get_wallet_balance():
         return 0.0
 
 
+def get_claimable_palm():
+    """รายได้จากการขายไฟที่ค้างอยู่ใน EnergyMarket (ยังไม่ได้ claim)"""
+    try:
+        return get_claimable([ADDRESS])[ADDRESS] / (10**18)
+    except Exception as e:
+        print(f"❌ ไม่สามารถดึงรายได้ที่ถอนได้: {e}")
+        return current_data["claimable"]
+
+
 def get_transaction_history():
     """ดึงประวัติการทำธุรกรรมจาก database"""
     try:
@@ -238,6 +250,7 @@ def dashboard():
 <html lang="th">
 <head>
     <meta charset="UTF-8">
+    <meta name="claim-token" content="{{ claim_token }}">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>🏠 House B - Energy Dashboard</title>
     <style>
@@ -406,6 +419,13 @@ def dashboard():
                 <div class="stat-value" id="walletBalance">0.000<span class="stat-unit">PALM</span></div>
             </div>
             
+            <div class="stat-card">
+                <div class="stat-icon">💸</div>
+                <div class="stat-title">รายได้ที่ถอนได้</div>
+                <div class="stat-value" id="claimable">0.000<span class="stat-unit">PALM</span></div>
+                <button id="claimButton" onclick="claimEarnings()">ถอนเข้ากระเป๋า</button>
+            </div>
+            
             <div class="stat-card">
                 <div class="stat-icon">🕐</div>
                 <div class="stat-title">อัปเดตครั้งถัดไป</div>
@@ -509,6 +529,25 @@ def dashboard():
             }
         }
         
+        async function claimEarnings() {
+            const button = document.getElementById('claimButton');
+            button.disabled = true;
+            try {
+                const token = document.querySelector('meta[name="claim-token"]').content;
+                const response = await fetch('/api/claim', {
+                    method: 'POST',
+                    headers: { '{{ token_header }}': token },
+                });
+                const result = await response.json();
+                alert(result.message);
+                fetchData();
+            } catch (error) {
+                console.error('Error claiming earnings:', error);
+            } finally {
+                button.disabled = false;
+            }
+        }
+        
         async function fetchData() {
             try {
                 const statsGrid = document.getElementById('statsGrid');
@@ -524,6 +563,8 @@ def dashboard():
                     `${data.total_generated.toFixed(5)}<span class="stat-unit">kWh</span>`;
                 document.getElementById('walletBalance').innerHTML = 
                     `${data.wallet_balance.toFixed(3)}<span class="stat-unit">PALM</span>`;
+                document.getElementById('claimable').innerHTML = 
+                    `${data.claimable.toFixed(3)}<span class="stat-unit">PALM</span>`;
                 
                 statsGrid.classList.remove('loading');
                 
@@ -595,14 +636,17 @@ def dashboard():
 </body>
 </html>
     """
-    return render_template_string(html_template)
+    return render_template_string(html_template, claim_token=CLAIM_TOKEN, token_header=TOKEN_HEADER)
 
 
 @app.route("/api/data")
 def get_current_data():
     """API endpoint สำหรับดึงข้อมูลปัจจุบัน"""
-    # อัปเดต wallet balance
-    current_data["wallet_balance"] = get_wallet_balance()
+    # อัปเดต wallet balance (ต่อ chain ไม่ได้ → ใช้ยอดล่าสุดที่อ่านได้ ข้อมูลจาก DB ยังแสดงตามปกติ)
+    if monitor.available():
+        current_data["wallet_balance"] = get_wallet_balance()
+        current_data["claimable"] = get_claimable_palm()
+    current_data["chain"] = monitor.status()
     return jsonify(current_data)
 
 
@@ -613,6 +657,24 @@ def get_history():
     return jsonify({"history": history})
 
 
+@app.route("/api/claim", methods=["POST"])
+def claim_earnings():
+    """API endpoint สำหรับถอนรายได้ที่ค้างเข้ากระเป๋า (ส่ง tx แล้วตอบกลับทันที ไม่รอ receipt)"""
+    # ส่ง tx ด้วย key ของบ้าน → รับเฉพาะจากหน้า dashboard นี้เอง (ดู dashboard_guard.py)
+    if not post_allowed(request):
+        return jsonify({"message": "ไม่อนุญาต"}), 403
+    if not monitor.available():
+        return jsonify({"message": "ต่อ chain ไม่ได้ ลองใหม่ภายหลัง"}), 503
+    try:
+        handles = sweep_earnings(ADDRESS, PRIVATE_KEY, [ADDRESS])
+    except Exception as e:
+        print(f"❌ claim ไม่สำเร็จ: {e}")
+        return jsonify({"message": f"ถอนไม่สำเร็จ: {e}"}), 500
+    if not handles:
+        return jsonify({"message": "ไม่มีรายได้ค้างให้ถอน", "tx": []})
+    return jsonify({"message": "ส่งคำขอถอนแล้ว รอยืนยันบน chain", "tx": [h.tx_hash for h in handles]})
+
+
 @app.route("/api/monthly")
 def get_monthly():
     """API endpoint สำหรับดึงสรุปการใช้ไฟรายเดือน"""
@@ -669,15 +731,21 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            # ✅ ส่งทุกครั้ง แม้ delta_gen = 0
-            gen_int = int(delta_gen * SCALE)
-            report_energy(ADDRESS, PRIVATE_KEY, gen_int, 0)
-
-            if delta_gen == 0:
-                print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
-            else:
-                print(f"📡 ส่ง delta_gen = {gen_int}")
+            try:
+                # ✅ ส่งทุกครั้ง แม้ delta_gen = 0
+                gen_int = int(delta_gen * SCALE)
+                submit_report_energy(ADDRESS, PRIVATE_KEY, gen_int, 0)
+
+                if delta_gen == 0:
+                    print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
+                else:
+                    print(f"📡 ส่ง delta_gen = {gen_int}")
+            except Exception as e:
+                # RPC error / nonce / tx ล้ม → ข้ามรอบนี้ แต่ loop ต้องวิ่งต่อ (ค่ามิเตอร์อยู่ใน DB แล้ว)
+                print(f"❌ ส่ง tx รอบนี้ไม่สำเร็จ: {e}")
 
         time.sleep(300)
 
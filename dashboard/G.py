@@ -15,8 +15,9 @@ except ImportError:
     CORS_AVAILABLE = False
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, pay_energy, reset_energy
-from config import web3, token_contract, market_contract
+from helpers import submit_report_energy, submit_pay_energy, reset_energy
+from preflight import PreflightFailed
+from config import web3, token_contract, market_contract, read_cache, monitor
 
 load_dotenv()
 
@@ -130,7 +131,7 @@ def get_wallet_balance():
         balance_contract = web3.eth.contract(address=token_address, abi=balance_abi)
 
         # ดึง balance จาก address ที่ได้จาก private key
-        balance_wei = balance_contract.functions.balanceOf(account.address).call()
+        balance_wei = read_cache.call(balance_contract.functions.balanceOf(account.address))
         balance_palm = balance_wei / (10**18)
 
         # แสดง log สำหรับการ debug
@@ -592,8 +593,10 @@ def dashboard():
 @app.route("/api/data")
 def get_current_data():
     """API endpoint สำหรับดึงข้อมูลปัจจุบัน"""
-    # อัปเดต wallet balance
-    current_data["wallet_balance"] = get_wallet_balance()
+    # อัปเดต wallet balance (ต่อ chain ไม่ได้ → ใช้ยอดล่าสุดที่อ่านได้ ข้อมูลจาก DB ยังแสดงตามปกติ)
+    if monitor.available():
+        current_data["wallet_balance"] = get_wallet_balance()
+    current_data["chain"] = monitor.status()
     return jsonify(current_data)
 
 
@@ -657,10 +660,15 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
+            submit_report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
             if delta_con > 0:
-                pay_energy(ADDRESS, PRIVATE_KEY, con_int)
+                try:
+                    submit_pay_energy(ADDRESS, PRIVATE_KEY, con_int)
+                except PreflightFailed as e:
+                    print(f"⏭️ ข้ามการซื้อรอบนี้: {e.reason}")
             elif delta_con == 0:
                 print("ℹ️ ไม่มีการใช้ไฟเพิ่ม → ไม่ซื้อ/จ่าย")
 
@@ -689,12 +697,21 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
-            if delta_con > 0:
-                pay_energy(ADDRESS, PRIVATE_KEY, con_int)
-            elif delta_con == 0:
-                print("ℹ️ ไม่มีการใช้ไฟเพิ่ม → ไม่ซื้อ/จ่าย")
+            try:
+                submit_report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
+                if delta_con > 0:
+                    try:
+                        submit_pay_energy(ADDRESS, PRIVATE_KEY, con_int)
+                    except PreflightFailed as e:
+                        print(f"⏭️ ข้ามการซื้อรอบนี้: {e.reason}")
+                elif delta_con == 0:
+                    print("ℹ️ ไม่มีการใช้ไฟเพิ่ม → ไม่ซื้อ/จ่าย")
+            except Exception as e:
+                # RPC error / nonce / tx ล้ม → ข้ามรอบนี้ แต่ loop ต้องวิ่งต่อ (ค่ามิเตอร์อยู่ใน DB แล้ว)
+                print(f"❌ ส่ง tx รอบนี้ไม่สำเร็จ: {e}")
 
         time.sleep(300)
 
@@ -0,0 +1,30 @@
+"""กัน POST ของ dashboard (เช่น /api/claim ที่ส่ง tx ด้วย key ของบ้าน) จากหน้าเว็บอื่น
+
+dashboard ฟังที่ 0.0.0.0 → หน้าเว็บใดก็ได้ที่เปิดอยู่ใน browser ของเครื่องในวง LAN สั่ง POST มาเองได้
+- POST ต้องส่ง header X-Claim-Token ตรงกับ token ที่สุ่มตอนเริ่ม process (ฝังไว้ในหน้า dashboard ตอน render)
+  เว็บอื่นอ่าน token ไม่ได้ เพราะเปิด CORS ให้เฉพาะ API ที่อ่านข้อมูลอย่างเดียว (READ_ONLY_CORS)
+  และ header ที่ไม่ใช่มาตรฐานทำให้ browser ต้องถาม preflight ก่อน ซึ่ง /api/claim ไม่ตอบรับ
+- ถ้ามี Origin มาด้วย (browser ใส่ให้ทุก POST) ต้องเป็น host เดียวกับ dashboard
+"""
+import hmac
+import secrets
+from urllib.parse import urlsplit
+
+TOKEN_HEADER = "X-Claim-Token"
+CLAIM_TOKEN = secrets.token_urlsafe(32)
+
+# CORS(app, resources=READ_ONLY_CORS) → หน้า / กับ /api/claim ไม่เปิดให้เว็บอื่น
+READ_ONLY_CORS = {r"/api/(data|history|monthly)": {"methods": ["GET"]}}
+
+
+def same_origin(request):
+    origin = request.headers.get("Origin")
+    if not origin:
+        # ไม่ได้มาจาก browser (เช่น curl) → ตัดสินด้วย token อย่างเดียว
+        return True
+    return urlsplit(origin).netloc == request.host
+
+
+def post_allowed(request):
+    token = request.headers.get(TOKEN_HEADER, "")
+    return same_origin(request) and hmac.compare_digest(token, CLAIM_TOKEN)
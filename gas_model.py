@@ -0,0 +1,206 @@
+"""ตั้ง gas limit จาก gasUsed จริงใน receipt แทนค่าตายตัว
+
+function ที่วนลูปตามจำนวนบ้าน (claimFor / batchReport วนตามจำนวนบ้านใน batch) → เก็บ sample แยกตาม (function, จำนวนบ้าน)
+limit = p99 ของ gasUsed * margin เมื่อมี sample พอ
+ถ้ายังไม่มี (เช่นเพิ่งมีบ้านลงทะเบียนเพิ่ม) → ใช้ estimate_gas ที่แคชไว้ต่อ (function, จำนวนบ้าน, ผู้ส่ง)
+(estimate แยกผู้ส่ง เพราะ storage ของแต่ละบ้านต่างกัน เช่นเขียนช่องที่เป็น 0 แพงกว่าช่องที่มีค่าอยู่แล้ว)
+estimate ที่แคชไว้อาจต่ำกว่าที่ state ตอนนี้ต้องใช้ → limit ไม่ต่ำกว่าค่าสำรองเดิมของผู้เรียก
+"""
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GAS_MODEL_DB = os.getenv("GAS_MODEL_DB", "gas_model.db")
+
+# function ที่ gas ขึ้นกับจำนวนบ้าน (ตัวอื่นเก็บรวมกันที่ households = 0)
+# payEnergy จ่ายผู้ขายผ่านตัวสะสมใน contract แล้ว gas ไม่โตตามจำนวนบ้านอีก
+SCALES_WITH_HOUSEHOLDS = frozenset({"claimFor", "batchReport"})
+
+
+class GasModel:
+    def __init__(self, web3, household_count, db_path=GAS_MODEL_DB, margin=1.2,
+                 percentile=99, min_samples=20, window=500, count_ttl=60):
+        self.web3 = web3
+        self._household_count = household_count  # callable → จำนวนบ้านใน contract
+        self.db_path = db_path
+        self.margin = margin
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.count_ttl = count_ttl
+
+        self._samples = {}
+        self._estimates = {}
+        self._count = None
+        self._count_at = 0.0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    # -------------------------------
+    # DB
+    # -------------------------------
+    def _init_db(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS gas_samples (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fn TEXT,
+                households INTEGER,
+                gas_used INTEGER,
+                ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_gas_fn ON gas_samples (fn, households, id)")
+        conn.commit()
+        rows = conn.execute("SELECT fn, households, gas_used FROM gas_samples ORDER BY id").fetchall()
+        conn.close()
+        for fn, households, gas_used in rows:
+            self._window(fn, households).append(gas_used)
+
+    def _window(self, fn, households):
+        key = (fn, households)
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.window)
+        return self._samples[key]
+
+    # -------------------------------
+    # จำนวนบ้าน
+    # -------------------------------
+    def household_count(self):
+        """จำนวนบ้านที่ลงทะเบียน (ถาม chain ไม่เกิน 1 ครั้งต่อ count_ttl วินาที)"""
+        now = time.monotonic()
+        if self._count is None or now - self._count_at >= self.count_ttl:
+            try:
+                self._count = self._household_count()
+                self._count_at = now
+            except Exception as e:
+                print(f"⚠️ gas model: อ่านจำนวนบ้านไม่ได้ ({e})")
+                if self._count is None:
+                    return 0
+        return self._count
+
+    async def household_count_async(self, count_async):
+        """household_count สำหรับ event loop: count_async() = coroutine ที่คืนจำนวนบ้าน (ผ่าน async_web3)"""
+        now = time.monotonic()
+        if self._count is None or now - self._count_at >= self.count_ttl:
+            try:
+                self._count = await count_async()
+                self._count_at = now
+            except Exception as e:
+                print(f"⚠️ gas model: อ่านจำนวนบ้านไม่ได้ ({e})")
+                if self._count is None:
+                    return 0
+        return self._count
+
+    def invalidate_count(self):
+        """ให้ถามจำนวนบ้านใหม่ครั้งถัดไป (เช่นหลังลงทะเบียนบ้านเพิ่ม)"""
+        self._count = None
+
+    def _key(self, fn, households):
+        return (fn, households if fn in SCALES_WITH_HOUSEHOLDS else 0)
+
+    # -------------------------------
+    # Gas limit
+    # -------------------------------
+    def _p(self, samples):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, len(ordered) * self.percentile // 100)]
+
+    def _estimate(self, key, call, sender, default):
+        key = key + (sender,)
+        with self._lock:
+            if key in self._estimates:
+                return self._estimates[key]
+        try:
+            gas = int(self.web3.eth.estimate_gas({"from": sender, "to": call.to, "data": call.data}) * self.margin)
+        except Exception as e:
+            # เช่น payEnergy revert เพราะยังไม่มีผู้ขาย → ใช้ค่าเดิมไปก่อน ไม่แคช
+            print(f"⚠️ estimate_gas {call.name} ไม่สำเร็จ ({e}) → ใช้ {default}")
+            return default
+        return self._remember_estimate(key, call, gas)
+
+    def _remember_estimate(self, key, call, gas):
+        with self._lock:
+            self._estimates[key] = gas
+        print(f"⛽ gas limit {call.name} (บ้าน {key[1]}) จาก estimate_gas → {gas}")
+        return gas
+
+    def gas_limit(self, call, sender, households, default):
+        """p99 * margin ถ้ามี sample พอ ไม่งั้นใช้ estimate_gas ที่แคชไว้ (ไม่ต่ำกว่า default)"""
+        key = self._key(call.name, households)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples and len(samples) >= self.min_samples:
+                return int(self._p(samples) * self.margin)
+        return max(self._estimate(key, call, sender, default), default)
+
+    async def gas_limit_async(self, call, sender, households, default, async_web3):
+        """gas_limit สำหรับ event loop: estimate_gas ผ่าน async_web3 (แคชชุดเดียวกับ gas_limit)"""
+        key = self._key(call.name, households)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples and len(samples) >= self.min_samples:
+                return int(self._p(samples) * self.margin)
+            gas = self._estimates.get(key + (sender,))
+        if gas is None:
+            try:
+                estimate = await async_web3.eth.estimate_gas({"from": sender, "to": call.to, "data": call.data})
+            except Exception as e:
+                print(f"⚠️ estimate_gas {call.name} ไม่สำเร็จ ({e}) → ใช้ {default}")
+                return default
+            gas = self._remember_estimate(key + (sender,), call, int(estimate * self.margin))
+        return max(gas, default)
+
+    # -------------------------------
+    # เก็บ sample จาก receipt
+    # -------------------------------
+    def record(self, fn, households, gas_used):
+        key = self._key(fn, households)
+        with self._lock:
+            self._window(*key).append(gas_used)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gas_samples (fn, households, gas_used) VALUES (?, ?, ?)", (*key, gas_used))
+        conn.commit()
+        conn.close()
+
+    def forget(self, fn, households):
+        """ทิ้ง sample + estimate ของ (function, จำนวนบ้าน) ทั้งในหน่วยความจำและใน DB"""
+        key = self._key(fn, households)
+        with self._lock:
+            for k in [k for k in self._estimates if k[:2] == key]:
+                del self._estimates[k]
+            self._samples.pop(key, None)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM gas_samples WHERE fn = ? AND households = ?", key)
+        conn.commit()
+        conn.close()
+
+    def _on_done(self, fn, households, gas, handle):
+        if handle.exception() is not None:
+            return
+        receipt = handle.result()
+        if receipt["status"] == 0 and receipt["gasUsed"] >= gas:
+            # ใช้ gas จนหมด limit → out of gas ไม่ใช่ revert ปกติ ให้ estimate ใหม่รอบหน้า
+            print(f"⛽ {fn} out of gas (limit {gas}, บ้าน {households}) → estimate ใหม่")
+            # sample เดิมต่ำเกินสภาพ contract ตอนนี้แล้ว (ลบจาก DB ด้วย ไม่งั้นเริ่ม process ใหม่ก็โหลดกลับมา)
+            self.forget(fn, households)
+            return
+        if receipt["status"] == 1:
+            self.record(fn, households, receipt["gasUsed"])
+
+    def watch(self, handle, fn, households, gas):
+        """เก็บ gasUsed ของ tx นี้เมื่อถูก mine"""
+        handle.add_done_callback(lambda h: self._on_done(fn, households, gas, h))
+
+    def summary(self):
+        with self._lock:
+            return {
+                f"{fn}@{n}": {"samples": len(s), f"p{self.percentile}": self._p(s)}
+                for (fn, n), s in self._samples.items() if s
+            }
@@ -0,0 +1,132 @@
+import time
+import asyncio
+import threading
+
+# legacy  → gasPrice = eth_gasPrice * multiplier (แบบเดิมของ helpers)
+# eip1559 → maxFeePerGas / maxPriorityFeePerGas จาก eth_feeHistory
+FEE_MODES = ("legacy", "eip1559")
+
+
+class GasOracle:
+    """แคชค่า gas ไว้ใช้ร่วมกันทุก tx ในรอบเดียวกัน แทนการยิง eth_gasPrice ทุก tx"""
+
+    def __init__(self, web3, mode="legacy", ttl=30, multiplier=1.2,
+                 history_blocks=5, percentile=50, min_priority_fee=10**7):
+        if mode not in FEE_MODES:
+            raise ValueError(f"ไม่รู้จัก gas mode: {mode}")
+        self.web3 = web3
+        self.mode = mode
+        self.ttl = ttl
+        self.multiplier = multiplier
+        self.history_blocks = history_blocks
+        self.percentile = percentile
+        self.min_priority_fee = min_priority_fee
+
+        self._fees = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._saved_ttl = None  # TTL ก่อน start(on_new_block=True)
+        self._async_lock = None  # asyncio.Lock สร้างตอนใช้ครั้งแรก (ต้องอยู่ใน event loop)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------
+    # คำนวณค่า fee
+    # -------------------------------
+    def _legacy_fees(self, gas_price):
+        return {"gasPrice": int(gas_price * self.multiplier)}
+
+    def _eip1559_fees(self, history, latest_base_fee=None):
+        # baseFeePerGas ตัวสุดท้าย = base fee ของ block ถัดไป
+        base_fees = history.get("baseFeePerGas") or []
+        next_base_fee = base_fees[-1] if base_fees else latest_base_fee
+        rewards = sorted(r[0] for r in history.get("reward") or [] if r)
+        tip = rewards[len(rewards) // 2] if rewards else 0
+        tip = max(int(tip * self.multiplier), self.min_priority_fee)
+        return {
+            "maxFeePerGas": 2 * next_base_fee + tip,
+            "maxPriorityFeePerGas": tip,
+        }
+
+    def _store(self, fees):
+        self._fees = fees
+        self._fetched_at = time.monotonic()
+        return fees
+
+    def _stale(self):
+        return self._fees is None or time.monotonic() - self._fetched_at >= self.ttl
+
+    def refresh(self):
+        if self.mode == "legacy":
+            return self._store(self._legacy_fees(self.web3.eth.gas_price))
+        history = self.web3.eth.fee_history(self.history_blocks, "latest", [self.percentile])
+        latest_base_fee = None
+        if not history.get("baseFeePerGas"):
+            latest_base_fee = self.web3.eth.get_block("latest")["baseFeePerGas"]
+        return self._store(self._eip1559_fees(history, latest_base_fee))
+
+    def fee_params(self):
+        """คืน dict ค่า fee สำหรับใส่ใน build_transaction (refresh เมื่อเกิน TTL)"""
+        with self._lock:
+            if self._stale():
+                self.refresh()
+            return dict(self._fees)
+
+    async def fee_params_async(self, async_web3):
+        """fee_params สำหรับ event loop: refresh ผ่าน async_web3 (coroutine ที่มาพร้อมกันรอผลเดียวกัน)"""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._stale():
+                if self.mode == "legacy":
+                    fees = self._legacy_fees(await async_web3.eth.gas_price)
+                else:
+                    history = await async_web3.eth.fee_history(self.history_blocks, "latest", [self.percentile])
+                    latest_base_fee = None
+                    if not history.get("baseFeePerGas"):
+                        latest_base_fee = (await async_web3.eth.get_block("latest"))["baseFeePerGas"]
+                    fees = self._eip1559_fees(history, latest_base_fee)
+                with self._lock:
+                    self._store(fees)
+        with self._lock:
+            return dict(self._fees)
+
+    # -------------------------------
+    # Background refresh
+    # -------------------------------
+    def _run(self, on_new_block, poll_interval):
+        last_block = None
+        while not self._stop.is_set():
+            try:
+                if on_new_block:
+                    block = self.web3.eth.block_number
+                    if block != last_block:
+                        with self._lock:
+                            self.refresh()
+                        last_block = block
+                else:
+                    with self._lock:
+                        self.refresh()
+            except Exception as e:
+                print(f"⚠️ gas oracle refresh ไม่สำเร็จ: {e}")
+            self._stop.wait(poll_interval if on_new_block else self.ttl)
+
+    def start(self, on_new_block=False, poll_interval=2):
+        """เริ่ม thread refresh เบื้องหลัง ทุก TTL หรือทุก block ใหม่ (on_new_block=True)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if on_new_block:
+            # ค่าถูก refresh ทุก block อยู่แล้ว ไม่ต้องหมดอายุตาม TTL (stop() คืน TTL เดิม)
+            self._saved_ttl = self.ttl
+            self.ttl = float("inf")
+        self._thread = threading.Thread(
+            target=self._run, args=(on_new_block, poll_interval), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        # ไม่มี thread refresh ทุก block แล้ว → กลับไปหมดอายุตาม TTL เดิม ไม่งั้นค่า fee ค้างตลอดไป
+        if self._saved_ttl is not None:
+            self.ttl, self._saved_ttl = self._saved_ttl, None
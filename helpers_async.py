@@ -0,0 +1,128 @@
+"""helpers เวอร์ชัน asyncio: event loop เดียวขับหลายร้อยบ้านพร้อมกันได้ ไม่ต้องใช้ thread ต่อบ้าน
+
+nonce / gas / allowance / receipt ใช้ตัวเดียวกับ helpers.py จึงใช้ปนกันใน process เดียวได้
+RPC ตอนส่ง (nonce / gas / จำนวนบ้าน / estimate_gas / allowance / preflight / send) ยิงผ่าน async_web3
+(failover + สถิติชุดเดียวกับ web3) ไม่มี to_thread ในเส้นทางส่ง tx
+ที่ยังเป็น thread คือตัวที่ใช้ร่วมกับ helpers.py: ReceiptTracker / TxAccelerator poll ด้วย web3 แบบ sync
+และ gas_model เขียน sample ลง SQLite ใน callback ของ tracker thread → await receipt ผ่าน asyncio.wrap_future
+"""
+import asyncio
+
+from config import (
+    CHAIN_ID, MARKET_ADDRESS, PAY_PREFLIGHT, PAY_MAX_PRICE,
+    async_web3, async_token_contract, async_market_contract, read_cache,
+)
+from fast_tx import build_tx, local_account
+from latency import registry as latency
+from helpers import (
+    nonce_manager,
+    market_calls,
+    token_calls,
+    gas_oracle,
+    tracker,
+    accelerator,
+    gas_model,
+    preflight,
+    allowance_ledger,
+    APPROVE_AMOUNT,
+    _on_approve_done,
+    _on_pay_done,
+)
+from nonce_manager import is_nonce_error
+from preflight import PreflightFailed
+
+
+async def _send_tx(addr, pk, call, gas):
+    """build + sign + ส่ง tx แบบ async (resync nonce แล้วลองใหม่ 1 ครั้งถ้า nonce ไม่ตรง)"""
+    for attempt in range(2):
+        # ส่วนใหญ่ไม่มี RPC (อ่านจาก memory/cache) → ถาม chain ผ่าน async_web3 เฉพาะตอนจำเป็น
+        with latency.span(addr, "nonce", call.name):
+            nonce = await nonce_manager.next_nonce_async(addr, async_web3)
+        try:
+            with latency.span(addr, "gas", call.name):
+                fees = await gas_oracle.fee_params_async(async_web3)
+            with latency.span(addr, "build", call.name):
+                tx = build_tx(call, CHAIN_ID, nonce, gas, fees)
+            with latency.span(addr, "sign", call.name):
+                raw_tx = local_account(pk).sign_transaction(tx).raw_transaction
+            with latency.span(addr, "send", call.name):
+                tx_hash = await async_web3.eth.send_raw_transaction(raw_tx)
+            return tx_hash, nonce, fees
+        except Exception as e:
+            if is_nonce_error(e) and attempt == 0:
+                await nonce_manager.resync_async(addr, async_web3)
+                continue
+            nonce_manager.release(addr, nonce)
+            raise
+
+
+async def _household_count():
+    return len(await async_market_contract.functions.householdList().call())
+
+
+async def _submit(addr, pk, call, gas, label, callback=None):
+    households = await gas_model.household_count_async(_household_count)
+    gas = await gas_model.gas_limit_async(call, addr, households, gas, async_web3)
+    tx_hash, nonce, fees = await _send_tx(addr, pk, call, gas)
+    handle = tracker.track(tx_hash, label, house=addr, fn=call.name)
+    handle.gas_limit = gas
+    # ค้างนานเกินไป → accelerator ส่งแทนด้วย nonce เดิม fee สูงขึ้น
+    accelerator.watch(handle, call, pk, nonce, gas, fees)
+    gas_model.watch(handle, call.name, households, gas)
+    if callback:
+        handle.add_done_callback(callback)
+    # ReceiptTracker เช็คทุก tx ที่ค้างใน batch เดียว → await ได้โดยไม่ต้อง poll เอง
+    return asyncio.wrap_future(handle)
+
+
+async def approve_token_if_needed(addr, pk, amount):
+    if await allowance_ledger.has_at_least_async(addr, amount, async_token_contract):
+        return None
+    print(f"🔑 {addr} approve {amount} PALM ให้ EnergyMarket")
+    allowance_ledger.expect(addr, APPROVE_AMOUNT)
+    try:
+        return await _submit(
+            addr, pk, token_calls.approve(MARKET_ADDRESS, APPROVE_AMOUNT), 100000,
+            f"approve {addr}", lambda h: _on_approve_done(addr, h),
+        )
+    except Exception:
+        allowance_ledger.settle(addr)
+        raise
+
+
+async def report_energy(addr, pk, gen, con):
+    future = await _submit(addr, pk, market_calls.reportEnergy(gen, con), 150000, f"reportEnergy {addr}")
+    print(f"📡 {addr} รายงาน Energy → ผลิต {gen}, ใช้ {con}")
+    return await future
+
+
+async def pay_energy(addr, pk, kwh):
+    """ซื้อไฟ → คืน receipt หรือ None ถ้าจ่ายไม่สำเร็จ"""
+    # ไม่ต้องรอ approve: payEnergy ใช้ nonce ถัดไป จึงถูก mine หลัง approve เสมอ
+    approve = await approve_token_if_needed(addr, pk, 10**24)
+
+    call = market_calls.payEnergy(addr, kwh, PAY_MAX_PRICE)
+    if PAY_PREFLIGHT and approve is None and not allowance_ledger.approving(addr):
+        try:
+            block = await read_cache.current_block_async(async_web3)
+            await preflight.check_async(call, addr, async_web3, block)
+        except PreflightFailed as e:
+            print(f"⏭️ {addr} ข้ามการซื้อ: {e.reason}")
+            return None
+
+    future = await _submit(
+        addr, pk, call, 250000,
+        f"payEnergy {addr}", lambda h: _on_pay_done(addr, kwh, h),
+    )
+    try:
+        receipt = await future
+    except Exception as e:
+        print(f"❌ Unknown error: {str(e)}")
+        return None
+    return receipt if receipt["status"] == 1 else None
+
+
+async def reset_energy(addr, pk):
+    future = await _submit(addr, pk, market_calls.resetEnergy(), 100000, f"resetEnergy {addr}")
+    print(f"🧹 {addr} resetEnergy()")
+    return await future
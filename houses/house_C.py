@@ -3,7 +3,8 @@ import time, os, sys, sqlite3
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, pay_energy, reset_energy
+from outbox import init_outbox, enqueue, enqueue_exit, enqueue_report, OutboxWorker
+from latency import registry as latency
 
 load_dotenv()
 
@@ -11,6 +12,7 @@ ADDRESS = os.getenv("C_ADDRESS")
 PRIVATE_KEY = os.getenv("C_PK")
 ROLE = "PROSUMER"
 DB_PATH = "energy_C.db"
+LATENCY_PATH = "latency_C.json"
 SCALE = 1000
 
 def init_db():
@@ -46,8 +48,10 @@ def save_energy(total_gen, total_con, delta_gen, delta_con):
         INSERT INTO energy_log (total_generated, total_consumed, delta_generated, delta_consumed)
         VALUES (?, ?, ?, ?)
     """, (total_gen, total_con, delta_gen, delta_con))
+    interval_id = cur.lastrowid
     conn.commit()
     conn.close()
+    return interval_id
 
 def init_baseline():
     conn = sqlite3.connect(DB_PATH)
@@ -65,20 +69,27 @@ def init_baseline():
 
 # -------------------------------
 init_db()
+init_outbox(DB_PATH)
 is_first_run = init_baseline()
 
+# ส่ง tx เข้า chain เบื้องหลังจาก outbox (loop นี้แค่เขียน DB)
+worker = OutboxWorker(DB_PATH, ADDRESS, PRIVATE_KEY)
+worker.start()
+
 try:
     while True:
-        last_gen, last_con = get_last_total()
+        with latency.span(ADDRESS, "meter_read"):
+            last_gen, last_con = get_last_total()
 
-        # ตัวอย่างจำลองการผลิต/ใช้
-        new_gen = round(last_gen + 0.002, 3)
-        new_con = round(last_con + 0.001, 3)
+            # ตัวอย่างจำลองการผลิต/ใช้
+            new_gen = round(last_gen + 0.002, 3)
+            new_con = round(last_con + 0.001, 3)
 
-        delta_gen = round(new_gen - last_gen, 3)
-        delta_con = round(new_con - last_con, 3)
+            delta_gen = round(new_gen - last_gen, 3)
+            delta_con = round(new_con - last_con, 3)
 
-        save_energy(new_gen, new_con, delta_gen, delta_con)
+        with latency.span(ADDRESS, "save_energy"):
+            interval_id = save_energy(new_gen, new_con, delta_gen, delta_con)
 
         net = delta_gen - delta_con
         print(f"\n🏠 House C → ผลิต {delta_gen:.3f}, ใช้ {delta_con:.3f} = Net {net:.3f} kWh")
@@ -89,13 +100,20 @@ try:
         else:
             gen_int = int(delta_gen * SCALE)
             con_int = int(delta_con * SCALE)
-            report_energy(ADDRESS, PRIVATE_KEY, gen_int, con_int)
+            enqueue_report(DB_PATH, interval_id, gen_int, con_int)
 
             if net < 0:
-                pay_energy(ADDRESS, PRIVATE_KEY, int(abs(net) * SCALE))
+                enqueue(DB_PATH, interval_id, "payEnergy", [int(abs(net) * SCALE)])
+            worker.notify()
 
+        # เวลาแต่ละช่วงของ pipeline (ดูด้วย python latency.py latency_C.json)
+        latency.dump_json(LATENCY_PATH)
         time.sleep(300)
 
 except KeyboardInterrupt:
-    print("🚪 ออกจากโปรแกรม → resetEnergy()")
-    reset_energy(ADDRESS, PRIVATE_KEY)
+    print("🚪 ออกจากโปรแกรม → resetEnergy() + claim() รายได้ที่ค้าง")
+    # reset ไม่ผูกกับ interval ใด → key ของตัวเอง (ดู enqueue_exit)
+    enqueue_exit(DB_PATH, "resetEnergy")
+    enqueue_exit(DB_PATH, "claim")
+    if not worker.wait_empty(60):
+        print("⚠️ ยังมี tx ค้างใน outbox → จะถูกส่งต่อเมื่อเปิดโปรแกรมครั้งหน้า")
@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+
+from web3.exceptions import MismatchedABI
+from dotenv import load_dotenv
+
+from config import web3, MARKET_ADDRESS, TOKEN_ADDRESS, token_contract, market_contract
+
+load_dotenv()
+
+INDEX_DB_PATH = os.getenv("INDEX_DB_PATH", "events.db")
+# block ที่ deploy สัญญา (เริ่ม index จากตรงนี้ ครั้งแรก)
+INDEX_START_BLOCK = int(os.getenv("INDEX_START_BLOCK", "0"))
+# ย้อนกลับไป index ใหม่ N block ล่าสุดทุกรอบ เผื่อ chain reorg
+REORG_DEPTH = int(os.getenv("INDEX_REORG_DEPTH", "12"))
+
+MIN_RANGE = 10
+MAX_RANGE = 10000
+
+EVENT_TABLES = {
+    "HouseholdRegistered": "household_registered",
+    "EnergyReported": "energy_reported",
+    "EnergyReset": "energy_reset",
+    "EnergyPaid": "energy_paid",
+    "Claimed": "claims",
+    "Transfer": "transfers",
+}
+
+
+# -------------------------------
+# DB
+# -------------------------------
+def init_db(db_path=INDEX_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    columns = {row[1]: row[2] for row in cur.execute("PRAGMA table_info(energy_reported)")}
+    if columns.get("generated") == "INTEGER":
+        # DB จากเวอร์ชันเก่าเก็บ kWh เป็น INTEGER → สร้างตารางใหม่แล้ว index จาก INDEX_START_BLOCK อีกรอบ
+        print("🔁 events.db เป็น schema เก่า → index ใหม่ทั้งหมด")
+        for table in list(EVENT_TABLES.values()) + ["checkpoint"]:
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.executescript("""
+        CREATE TABLE IF NOT EXISTS checkpoint (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_block INTEGER NOT NULL,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS household_registered (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            user TEXT, role INTEGER,
+            UNIQUE (tx_hash, log_index)
+        );
+        -- uint256 ทุกช่อง (kWh / wei) เก็บเป็น TEXT เพราะเกิน INTEGER ของ SQLite
+        CREATE TABLE IF NOT EXISTS energy_reported (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            user TEXT, generated TEXT, consumed TEXT,
+            UNIQUE (tx_hash, log_index)
+        );
+        CREATE TABLE IF NOT EXISTS energy_reset (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            user TEXT,
+            UNIQUE (tx_hash, log_index)
+        );
+        CREATE TABLE IF NOT EXISTS energy_paid (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            buyer TEXT, kwh TEXT, price_per_kwh TEXT, total_cost TEXT,
+            UNIQUE (tx_hash, log_index)
+        );
+        CREATE TABLE IF NOT EXISTS claims (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            house TEXT, amount TEXT,
+            UNIQUE (tx_hash, log_index)
+        );
+        CREATE TABLE IF NOT EXISTS transfers (
+            block_number INTEGER, tx_hash TEXT, log_index INTEGER,
+            from_addr TEXT, to_addr TEXT, value TEXT,
+            UNIQUE (tx_hash, log_index)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_reported_user ON energy_reported (user, block_number);
+        CREATE INDEX IF NOT EXISTS idx_paid_buyer ON energy_paid (buyer, block_number);
+        CREATE INDEX IF NOT EXISTS idx_transfers_from ON transfers (from_addr, block_number);
+        CREATE INDEX IF NOT EXISTS idx_transfers_to ON transfers (to_addr, block_number);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def get_checkpoint(conn):
+    row = conn.execute("SELECT last_block FROM checkpoint WHERE id = 1").fetchone()
+    return row[0] if row else None
+
+
+def _insert(cur, name, log):
+    args = log["args"]
+    base = (log["blockNumber"], log["transactionHash"].to_0x_hex(), log["logIndex"])
+    if name == "HouseholdRegistered":
+        row = (args["user"].lower(), args["role"])
+    elif name == "EnergyReported":
+        row = (args["user"].lower(), str(args["generated"]), str(args["consumed"]))
+    elif name == "EnergyReset":
+        row = (args["user"].lower(),)
+    elif name == "EnergyPaid":
+        row = (args["buyer"].lower(), str(args["kwh"]), str(args["pricePerKwh"]), str(args["totalCost"]))
+    elif name == "Claimed":
+        row = (args["house"].lower(), str(args["amount"]))
+    else:
+        row = (args["from"].lower(), args["to"].lower(), str(args["value"]))
+    values = base + row
+    cur.execute(
+        f"INSERT OR IGNORE INTO {EVENT_TABLES[name]} VALUES ({', '.join('?' * len(values))})",
+        values,
+    )
+
+
+# -------------------------------
+# Sync
+# -------------------------------
+def _topic_map():
+    events = {}
+    for contract, names in (
+        (market_contract, ("HouseholdRegistered", "EnergyReported", "EnergyReset", "EnergyPaid", "Claimed")),
+        (token_contract, ("Transfer",)),
+    ):
+        for name in names:
+            event = contract.events[name]()
+            events[event.topic] = (name, event)
+    return events
+
+
+def _decode(events, log):
+    topic0 = log["topics"][0].to_0x_hex() if log["topics"] else None
+    if topic0 not in events:
+        return None, None
+    name, event = events[topic0]
+    try:
+        return name, event.process_log(log)
+    except MismatchedABI:
+        return None, None
+
+
+def sync(db_path=INDEX_DB_PATH, to_block=None, start_range=2000):
+    """ดึง log ใหม่ตั้งแต่ checkpoint ถึง head แล้วเขียนลง SQLite → คืน block ล่าสุดที่ index แล้ว"""
+    events = _topic_map()
+    head = web3.eth.block_number if to_block is None else to_block
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    last = get_checkpoint(conn)
+    if last is None:
+        from_block = INDEX_START_BLOCK
+    else:
+        # ย้อน REORG_DEPTH block → ลบของเดิมแล้ว index ใหม่ทับ
+        from_block = max(INDEX_START_BLOCK, last - REORG_DEPTH + 1)
+    for table in EVENT_TABLES.values():
+        cur.execute(f"DELETE FROM {table} WHERE block_number >= ?", (from_block,))
+
+    step = start_range
+    start = from_block
+    while start <= head:
+        end = min(start + step - 1, head)
+        try:
+            logs = web3.eth.get_logs({
+                "address": [MARKET_ADDRESS, TOKEN_ADDRESS],
+                "fromBlock": start,
+                "toBlock": end,
+                "topics": [list(events)],
+            })
+        except Exception as e:
+            if step <= MIN_RANGE:
+                # ยกเลิก DELETE ของช่วง reorg ที่ยังไม่ได้ index ใหม่ → ข้อมูลเดิมยังอยู่ครบจนกว่ารอบหน้าจะสำเร็จ
+                conn.rollback()
+                conn.close()
+                raise
+            # ช่วงกว้างไป / log เยอะเกิน → ลดช่วงลงครึ่งหนึ่งแล้วลองใหม่
+            step = max(step // 2, MIN_RANGE)
+            print(f"⚠️ getLogs {start}-{end} ไม่สำเร็จ ({e}) → ลดช่วงเหลือ {step}")
+            continue
+
+        for log in logs:
+            name, decoded = _decode(events, log)
+            if name:
+                _insert(cur, name, decoded)
+        cur.execute(
+            "INSERT INTO checkpoint (id, last_block) VALUES (1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_block = excluded.last_block, ts = CURRENT_TIMESTAMP",
+            (end,),
+        )
+        conn.commit()
+
+        if len(logs) < 1000:
+            step = min(step * 2, MAX_RANGE)
+        start = end + 1
+
+    conn.close()
+    return head
+
+
+# -------------------------------
+# Queries (อ่านจาก disk อย่างเดียว ไม่ยิง RPC)
+# -------------------------------
+def _connect(db_path):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def token_balance(addr, db_path=INDEX_DB_PATH):
+    """ยอด PALM (wei) จาก Transfer ที่ index ไว้ (ต้อง index ตั้งแต่ block ที่ deploy token)"""
+    addr = addr.lower()
+    conn = _connect(db_path)
+    received = conn.execute("SELECT value FROM transfers WHERE to_addr = ?", (addr,)).fetchall()
+    sent = conn.execute("SELECT value FROM transfers WHERE from_addr = ?", (addr,)).fetchall()
+    conn.close()
+    return sum(int(v) for (v,) in received) - sum(int(v) for (v,) in sent)
+
+
+def earnings(addr, db_path=INDEX_DB_PATH):
+    """รายได้ (wei) ที่ EnergyMarket จ่ายให้ addr จากการขายไฟ (เฉพาะที่ claim แล้ว)"""
+    conn = _connect(db_path)
+    rows = conn.execute(
+        "SELECT value FROM transfers WHERE from_addr = ? AND to_addr = ?",
+        (MARKET_ADDRESS.lower(), addr.lower()),
+    ).fetchall()
+    conn.close()
+    return sum(int(v) for (v,) in rows)
+
+
+def trade_history(addr, limit=20, db_path=INDEX_DB_PATH):
+    """ประวัติซื้อ (EnergyPaid) และรับเงินขายไฟ (Transfer จาก market) ล่าสุดของ addr"""
+    addr = addr.lower()
+    conn = _connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT block_number, tx_hash, 'buy' AS type, kwh, total_cost FROM energy_paid
+        WHERE buyer = ?
+        UNION ALL
+        SELECT block_number, tx_hash, 'sell' AS type, NULL, value FROM transfers
+        WHERE from_addr = ? AND to_addr = ?
+        ORDER BY block_number DESC
+        LIMIT ?
+        """,
+        (addr, MARKET_ADDRESS.lower(), addr, limit),
+    ).fetchall()
+    conn.close()
+    return [
+        {"block": r[0], "tx": r[1], "type": r[2], "kwh": None if r[3] is None else int(r[3]), "amount_wei": int(r[4])}
+        for r in rows
+    ]
+
+
+if __name__ == "__main__":
+    init_db()
+    while True:
+        try:
+            head = sync()
+            print(f"📚 index ถึง block {head}")
+        except Exception as e:
+            print(f"❌ index ไม่สำเร็จ: {e}")
+        time.sleep(12)
@@ -0,0 +1,175 @@
+"""วัดเวลาแต่ละช่วงของ settlement pipeline (อ่านมิเตอร์ → tx ถูก mine) เก็บเป็น histogram แบบ HDR
+
+ทุก span แยกตาม (บ้าน, function, phase) อยู่ใน registry กลางของ process
+ดูผลด้วย registry.dump_text() / registry.dump_json() หรือรันไฟล์นี้ตรงๆ ให้พิมพ์ไฟล์ที่ dump ไว้
+
+phase ที่ใช้: meter_read, save_energy, nonce, gas, build, sign, send, first_seen, mined
+"""
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+PHASES = ("meter_read", "save_energy", "nonce", "gas", "build", "sign", "send", "first_seen", "mined")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    """histogram แบบ HDR: ความละเอียดคงที่ตาม significant figures ทุกช่วงค่า (หน่วย µs)
+
+    ค่าที่น้อยกว่า 2^sub_bits เก็บตรงตัว ค่าที่มากกว่านั้นตัดบิตท้ายออกจนเหลือ sub_bits บิต
+    จึงใช้หน่วยความจำแค่หลักร้อย bucket ต่อ 1 µs – หลายชั่วโมง
+    """
+
+    def __init__(self, significant_figures=2):
+        self.sub_bits = (2 * 10**significant_figures).bit_length()
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        shift = max(value.bit_length() - self.sub_bits, 0)
+        return (shift << self.sub_bits) + (value >> shift)
+
+    def _value_at(self, index):
+        shift = index >> self.sub_bits
+        low = (index & ((1 << self.sub_bits) - 1)) << shift
+        return low + ((1 << shift) >> 1)  # กลาง bucket
+
+    def record(self, value):
+        value = max(int(value), 0)
+        idx = self._index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= target:
+                return min(self._value_at(idx), self.max)
+        return self.max
+
+    def merge(self, other):
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += other.count
+        self.total += other.total
+        for v in (other.min, other.max):
+            if v is not None:
+                self.min = v if self.min is None else min(self.min, v)
+                self.max = v if self.max is None else max(self.max, v)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total // self.count if self.count else 0,
+            "min_us": self.min or 0,
+            "max_us": self.max or 0,
+            **{f"p{p:g}_us": self.percentile(p) for p in PERCENTILES},
+        }
+
+
+class LatencyRegistry:
+    def __init__(self, significant_figures=2):
+        self.significant_figures = significant_figures
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, house, phase, seconds, fn="-"):
+        key = (house or "-", fn or "-", phase)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self.significant_figures)
+            hist.record(seconds * 1e6)
+
+    @contextmanager
+    def span(self, house, phase, fn="-"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(house, phase, time.perf_counter() - start, fn)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self, by="house"):
+        """{house: {fn: {phase: summary}}} หรือ by="phase" รวมทุกบ้าน → {fn: {phase: summary}}"""
+        with self._lock:
+            items = list(self._histograms.items())
+        out = {}
+        if by == "phase":
+            merged = {}
+            for (_, fn, phase), hist in items:
+                key = (fn, phase)
+                if key not in merged:
+                    merged[key] = Histogram(self.significant_figures)
+                merged[key].merge(hist)
+            for (fn, phase), hist in merged.items():
+                out.setdefault(fn, {})[phase] = hist.summary()
+            return out
+        for (house, fn, phase), hist in items:
+            out.setdefault(house, {}).setdefault(fn, {})[phase] = hist.summary()
+        return out
+
+    def dump_json(self, path=None, by="house"):
+        data = json.dumps(self.snapshot(by), indent=2, ensure_ascii=False)
+        if path:
+            with open(path, "w") as f:
+                f.write(data)
+        return data
+
+    def dump_text(self, by="house"):
+        return format_text(self.snapshot(by))
+
+
+def _order(phase):
+    return PHASES.index(phase) if phase in PHASES else len(PHASES)
+
+
+def format_text(snapshot):
+    lines = []
+    first = next(iter(snapshot.values()), {})
+    if "count" in next(iter(first.values()), {}):
+        # snapshot(by="phase") → {fn: {phase: summary}}
+        groups = [("(ทุกบ้าน)", snapshot)]
+    else:
+        groups = list(snapshot.items())
+    header = f"    {'phase':<12}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    for house, fns in groups:
+        lines.append(f"🏠 {house}")
+        for fn, phases in fns.items():
+            lines.append(f"  ⚙️ {fn}")
+            lines.append(header)
+            for phase in sorted(phases, key=_order):
+                s = phases[phase]
+                lines.append(
+                    f"    {phase:<12}{s['count']:>8}{s['p50_us'] / 1000:>10.2f}{s['p90_us'] / 1000:>10.2f}"
+                    f"{s['p99_us'] / 1000:>10.2f}{s['max_us'] / 1000:>10.2f}"
+                )
+    return "\n".join(lines)
+
+
+# registry กลางของ process: helpers / tracker / house loop ใช้ตัวนี้
+registry = LatencyRegistry()
+span = registry.span
+record = registry.record
+
+
+if __name__ == "__main__":
+    # python latency.py latency_A.json → พิมพ์ไฟล์ที่ dump_json() ไว้เป็นตาราง
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            print(format_text(json.load(f)))
@@ -0,0 +1,325 @@
+"""Chain จำลองในเครื่อง (eth-tester + py-evm) สำหรับ KEYES_CHAIN=local
+
+ไม่ต้องพึ่ง Hoodi: compile Palm / EnergyMarket จาก sol.sol, deploy, ลงทะเบียนบ้าน A–G จาก .env ตาม role
+แล้วเติม ETH ให้ทุกบ้าน + PALM ให้บ้านที่ซื้อไฟได้
+
+- process เดียว (benchmark / ลองโค้ด): config.py สร้าง chain ใน process เลย
+- หลาย process (house_*.py + dashboard): รัน `python local_chain.py` ค้างไว้ เป็น JSON-RPC node ที่ LOCAL_RPC_URL
+  แล้ว config.py ของทุก process จะต่อเข้า node นี้แทน (address ของสัญญาอ่านจาก LOCAL_DEPLOYMENT)
+"""
+import os
+import ast
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+from dotenv import load_dotenv
+from eth_tester import EthereumTester, PyEVMBackend
+from eth_tester.exceptions import TransactionFailed
+from hexbytes import HexBytes
+from web3 import Web3, AsyncWeb3
+from web3.datastructures import AttributeDict
+from web3.providers import BaseProvider
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.eth_tester import EthereumTesterProvider
+
+from rpc_provider import RpcStats
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTRACT_SOURCE = os.path.join(BASE_DIR, "sol.sol")
+SOLC_VERSION = os.getenv("LOCAL_SOLC_VERSION", "0.8.24")
+# ผล compile แคชไว้ (ผูกกับ hash ของ sol.sol) → ครั้งต่อไปไม่ต้องมี solc
+ARTIFACTS_PATH = os.getenv("LOCAL_ARTIFACTS", os.path.join(BASE_DIR, ".local_chain", "contracts.json"))
+DEPLOYMENT_PATH = os.getenv("LOCAL_DEPLOYMENT", os.path.join(BASE_DIR, ".local_chain", "deployment.json"))
+LOCAL_RPC_URL = os.getenv("LOCAL_RPC_URL", "http://127.0.0.1:8545")
+
+INITIAL_SUPPLY = 1_000_000  # PALM (คูณ 10**18 ใน constructor)
+BUYER_PALM = 10_000 * 10**18
+HOUSE_ETH = 100 * 10**18
+
+# ตรงกับ enum Role ใน sol.sol
+ROLES = {"BUY_ONLY": 0, "SELL_ONLY": 1, "PROSUMER": 2}
+# role ของแต่ละบ้าน (เหมือนที่ตั้งไว้ใน houses/house_*.py) → override ได้ด้วย <X>_ROLE ใน .env
+HOUSE_ROLES = {
+    "A": "SELL_ONLY",
+    "B": "SELL_ONLY",
+    "C": "PROSUMER",
+    "D": "PROSUMER",
+    "E": "PROSUMER",
+    "F": "BUY_ONLY",
+    "G": "BUY_ONLY",
+}
+
+
+# -------------------------------
+# Compile
+# -------------------------------
+def _source_digest(source):
+    return hashlib.sha256(f"{SOLC_VERSION}\n{source}".encode()).hexdigest()
+
+
+def artifacts_info(path=ARTIFACTS_PATH):
+    """{"digest", "compiler"} ของแคชที่ใช้อยู่ (ให้ benchmark บันทึกว่าวัดจาก bytecode ตัวไหน)"""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {"digest": None, "compiler": None}
+    return {"digest": cached.get("digest"), "compiler": cached.get("compiler")}
+
+
+def compile_contracts(path=ARTIFACTS_PATH, source_path=CONTRACT_SOURCE):
+    """{"Palm": {"abi", "bin"}, "EnergyMarket": {...}} จากแคช หรือ compile ใหม่ด้วย py-solc-x"""
+    with open(source_path) as f:
+        source = f.read()
+    digest = _source_digest(source)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached.get("digest") == digest:
+            return cached["contracts"]
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import solcx
+    except ImportError:
+        raise RuntimeError("❌ ต้องติดตั้ง py-solc-x เพื่อ compile sol.sol (pip install py-solc-x)") from None
+    if SOLC_VERSION not in {str(v) for v in solcx.get_installed_solc_versions()}:
+        print(f"⬇️ ติดตั้ง solc {SOLC_VERSION}")
+        solcx.install_solc(SOLC_VERSION)
+    output = solcx.compile_source(
+        source, output_values=["abi", "bin"], solc_version=SOLC_VERSION, optimize=True
+    )
+    contracts = {
+        name.split(":")[-1]: {"abi": out["abi"], "bin": out["bin"]}
+        for name, out in output.items()
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"digest": digest, "compiler": f"solc {SOLC_VERSION}", "contracts": contracts}, f)
+    return contracts
+
+
+# -------------------------------
+# บ้านจาก .env
+# -------------------------------
+def households_from_env():
+    """[(ชื่อบ้าน, address, role)] ของทุกบ้านที่มี <X>_ADDRESS ใน .env"""
+    houses = []
+    for name, default_role in HOUSE_ROLES.items():
+        addr = os.getenv(f"{name}_ADDRESS")
+        if addr:
+            role = os.getenv(f"{name}_ROLE", default_role)
+            houses.append((name, Web3.to_checksum_address(addr), role))
+    return houses
+
+
+# -------------------------------
+# Chain
+# -------------------------------
+class LocalChainProvider(BaseProvider):
+    """provider ที่คุยกับ LocalChain ใน process แบบ JSON-RPC ดิบ (hex) เหมือน node จริง
+
+    helpers / rpc_batch / tracker จึงทำงานเหมือนตอนต่อ Hoodi ทุกอย่าง รวมถึง batch request
+    และนับสถิติต่อ method ใน self.stats แบบเดียวกับ PooledHTTPProvider
+    """
+
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+        self.stats = RpcStats()
+        self._ids = iter(range(1, 2**63))
+
+    def _request(self, method, params):
+        return self.chain.handle_rpc({"id": next(self._ids), "method": method, "params": params})
+
+    def make_request(self, method, params):
+        start = time.perf_counter()
+        response = self._request(method, params)
+        self.stats.record(method, time.perf_counter() - start, "error" in response)
+        return response
+
+    def make_batch_request(self, requests):
+        start = time.perf_counter()
+        responses = [self._request(method, params) for method, params in requests]
+        self.stats.record(f"batch[{len(requests)}]", time.perf_counter() - start)
+        return responses
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+class AsyncLocalChainProvider(AsyncBaseProvider):
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+        self._ids = iter(range(1, 2**63))
+
+    async def make_request(self, method, params):
+        return self.chain.handle_rpc({"id": next(self._ids), "method": method, "params": params})
+
+    async def is_connected(self, show_traceback=False):
+        return True
+
+
+class LocalChain:
+    def __init__(self, households=None, source_path=CONTRACT_SOURCE, artifacts_path=ARTIFACTS_PATH):
+        self.tester = EthereumTester(PyEVMBackend())
+        # eth-tester ไม่ thread-safe → ทุก request (house loop, tracker, gas oracle ...) ต่อคิวกัน
+        self._lock = threading.RLock()
+        # web3 ฝั่ง admin (ใช้ account ที่ unlock ไว้ของ eth-tester) สำหรับ deploy / ลงทะเบียน / ตอบ RPC
+        self.web3 = Web3(EthereumTesterProvider(self.tester))
+        self.provider = LocalChainProvider(self)
+        self.chain_id = self.web3.eth.chain_id
+        self.admin = self.web3.eth.accounts[0]
+        self.web3.eth.default_account = self.admin
+
+        self.contracts = compile_contracts(artifacts_path, source_path)
+        self.token = self._deploy("Palm", INITIAL_SUPPLY)
+        self.market = self._deploy("EnergyMarket", self.token.address)
+        self.households = []
+        self.add_households(households_from_env() if households is None else households)
+
+    def _deploy(self, name, *args):
+        artifact = self.contracts[name]
+        factory = self.web3.eth.contract(abi=artifact["abi"], bytecode=artifact["bin"])
+        receipt = self.web3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+        print(f"📜 deploy {name} → {receipt['contractAddress']}")
+        return self.web3.eth.contract(address=receipt["contractAddress"], abi=artifact["abi"])
+
+    def add_households(self, households, verbose=True):
+        """ลงทะเบียน [(ชื่อ, address, role)] + เติม ETH ทุกบ้าน และ PALM ให้บ้านที่ซื้อได้"""
+        with self._lock:
+            for name, addr, role in households:
+                self.web3.eth.send_transaction({"to": addr, "value": HOUSE_ETH})
+                self.market.functions.registerHousehold(addr, ROLES[role]).transact()
+                if role in ("BUY_ONLY", "PROSUMER"):
+                    self.token.functions.transfer(addr, BUYER_PALM).transact()
+                self.households.append((name, addr, role))
+                if verbose:
+                    print(f"🏠 House {name} ({role}) → {addr}")
+
+    def async_web3(self):
+        return AsyncWeb3(AsyncLocalChainProvider(self))
+
+    def deployment(self):
+        return {
+            "chain_id": self.chain_id,
+            "token_address": self.token.address,
+            "market_address": self.market.address,
+        }
+
+    # -------------------------------
+    # JSON-RPC node (ให้ process อื่นต่อเข้ามา)
+    # -------------------------------
+    def handle_rpc(self, request):
+        rpc_id = request.get("id")
+        try:
+            with self._lock:
+                # request_func = make_request ของ provider ผ่าน middleware ของ web3 (เช่นเติม from ให้ eth_call)
+                send = self.web3.provider.request_func(self.web3, self.web3.middleware_onion)
+                response = send(request["method"], request.get("params", []))
+        except TransactionFailed as e:
+            reason = e.args[0] if e.args else ""
+            if isinstance(reason, str) and reason.startswith("execution reverted: b"):
+                # custom error: eth-tester ส่ง revert data มาเป็น repr ของ bytes → แปลงกลับเป็น bytes
+                reason = ast.literal_eval(reason[len("execution reverted: "):])
+            error = {"code": 3}
+            if isinstance(reason, bytes):
+                # ส่ง revert data ดิบด้วยแบบ node จริง → web3 / preflight ถอด custom error ได้
+                error["data"] = "0x" + reason.hex()
+                reason = _decode_revert(reason)
+            if not reason.startswith("execution reverted"):
+                reason = f"execution reverted: {reason}"
+            error["message"] = reason
+            return {"jsonrpc": "2.0", "id": rpc_id, "error": error}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": rpc_id, "error": {"code": -32000, "message": str(e)}}
+        response = _to_rpc(dict(response))
+        response["id"] = rpc_id
+        return response
+
+    def serve(self, url=LOCAL_RPC_URL, deployment_path=DEPLOYMENT_PATH):
+        chain = self
+        parsed = urlparse(url)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if isinstance(body, list):
+                    result = [chain.handle_rpc(r) for r in body]
+                else:
+                    result = chain.handle_rpc(body)
+                data = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        os.makedirs(os.path.dirname(deployment_path), exist_ok=True)
+        with open(deployment_path, "w") as f:
+            json.dump({"rpc_url": url, **self.deployment()}, f, indent=2)
+
+        server = ThreadingHTTPServer((parsed.hostname, parsed.port), Handler)
+        print(f"🧪 local chain พร้อมที่ {url} (chain id {self.chain_id})")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(deployment_path)
+
+
+def _decode_revert(data):
+    # Error(string): selector 0x08c379a0 + offset + length + ข้อความ
+    if data[:4] == bytes.fromhex("08c379a0") and len(data) >= 68:
+        length = int.from_bytes(data[36:68], "big")
+        return data[68:68 + length].decode(errors="replace")
+    return "0x" + data.hex()
+
+
+def _to_rpc(value):
+    """ผลจาก eth-tester (int / bytes) → รูปแบบ JSON-RPC (hex string) ให้ client ทั่วไปอ่านได้"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, HexBytes)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, (dict, AttributeDict)):
+        return {k: _to_rpc(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_rpc(v) for v in value]
+    return value
+
+
+# -------------------------------
+# ใช้จาก config.py
+# -------------------------------
+def running_node(deployment_path=DEPLOYMENT_PATH):
+    """deployment ของ node ที่รันอยู่ (`python local_chain.py`) หรือ None ถ้าไม่มี"""
+    try:
+        with open(deployment_path) as f:
+            deployment = json.load(f)
+        requests.post(
+            deployment["rpc_url"],
+            json={"jsonrpc": "2.0", "id": 1, "method": "eth_chainId", "params": []},
+            timeout=1,
+        ).raise_for_status()
+        return deployment
+    except (OSError, ValueError, KeyError, requests.RequestException):
+        return None
+
+
+if __name__ == "__main__":
+    LocalChain().serve()
@@ -0,0 +1,123 @@
+import os
+import json
+import threading
+
+# เก็บ nonce ถัดไปของแต่ละ address ไว้ในหน่วยความจำ
+# และเขียนลงไฟล์ (1 ไฟล์ต่อ address) เพื่อให้ restart แล้วไม่ต้องถาม chain ใหม่
+NONCE_STATE_DIR = os.getenv("NONCE_STATE_DIR", ".nonces")
+
+# ข้อความ error จาก node ที่แปลว่า nonce ในเครื่องไม่ตรงกับ chain แล้ว
+RESYNC_ERRORS = (
+    "nonce too low",
+    "replacement transaction underpriced",
+)
+
+
+def is_nonce_error(exc):
+    """เช็คว่า error ที่ได้จากการส่ง tx เกิดจาก nonce ไม่ตรงหรือไม่"""
+    msg = str(exc).lower()
+    return any(e in msg for e in RESYNC_ERRORS)
+
+
+class NonceManager:
+    """แจก nonce ต่อ address แบบ atomic ข้าม thread โดยไม่ต้องยิง RPC ทุกครั้ง"""
+
+    def __init__(self, web3, state_dir=NONCE_STATE_DIR):
+        self.web3 = web3
+        self.state_dir = state_dir
+        self._nonces = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, addr):
+        with self._guard:
+            if addr not in self._locks:
+                self._locks[addr] = threading.Lock()
+            return self._locks[addr]
+
+    def _state_path(self, addr):
+        return os.path.join(self.state_dir, f"{addr.lower()}.json")
+
+    def _load(self, addr):
+        if not self.state_dir:
+            return None
+        try:
+            with open(self._state_path(addr)) as f:
+                return int(json.load(f)["next_nonce"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, addr, nonce):
+        if not self.state_dir:
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(addr)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"next_nonce": nonce}, f)
+        os.replace(tmp, path)
+
+    def _forget(self, addr):
+        self._nonces.pop(addr, None)
+        if not self.state_dir:
+            return
+        try:
+            os.remove(self._state_path(addr))
+        except FileNotFoundError:
+            pass
+
+    def _fetch(self, addr):
+        return self.web3.eth.get_transaction_count(addr, "pending")
+
+    def next_nonce(self, addr):
+        """คืน nonce ถัดไปของ addr แล้วขยับตัวนับ (RPC เฉพาะครั้งแรกที่ไม่มี state)"""
+        with self._lock_for(addr):
+            nonce = self._nonces.get(addr)
+            if nonce is None:
+                nonce = self._load(addr)
+            if nonce is None:
+                nonce = self._fetch(addr)
+            self._nonces[addr] = nonce + 1
+            self._save(addr, nonce + 1)
+            return nonce
+
+    async def next_nonce_async(self, addr, async_web3):
+        """next_nonce สำหรับ event loop: ถาม chain ผ่าน async_web3 เฉพาะครั้งแรกที่ไม่มี state"""
+        if self._nonces.get(addr) is None and self._load(addr) is None:
+            fetched = await async_web3.eth.get_transaction_count(addr, "pending")
+            with self._lock_for(addr):
+                if self._nonces.get(addr) is None:
+                    self._nonces[addr] = fetched
+        return self.next_nonce(addr)
+
+    def release(self, addr, nonce):
+        """คืน nonce ที่จองไว้แต่ส่ง tx ไม่สำเร็จ
+
+        ตัวล่าสุด → ถอยตัวนับกลับ 1
+        มี nonce ถัดไปถูกแจกไปแล้ว → tx พวกนั้นจะค้างรอช่องว่างนี้ตลอดไป จึงทิ้ง state ของ addr
+        ให้ next_nonce ครั้งถัดไปดึง get_transaction_count(addr, "pending") ใหม่ (ได้ nonce ที่ว่างอยู่ → เติมช่องว่าง)
+        """
+        with self._lock_for(addr):
+            if self._nonces.get(addr) == nonce + 1:
+                self._nonces[addr] = nonce
+                self._save(addr, nonce)
+            elif addr in self._nonces:
+                self._forget(addr)
+                print(f"🔄 {addr} nonce {nonce} ส่งไม่สำเร็จหลังแจกตัวถัดไปแล้ว → ดึง nonce จาก chain ใหม่ครั้งถัดไป")
+
+    def resync(self, addr):
+        """ดึง nonce จาก chain ใหม่ หลังเจอ nonce too low / replacement underpriced"""
+        with self._lock_for(addr):
+            nonce = self._fetch(addr)
+            self._nonces[addr] = nonce
+            self._save(addr, nonce)
+            print(f"🔄 {addr} resync nonce → {nonce}")
+            return nonce
+
+    async def resync_async(self, addr, async_web3):
+        nonce = await async_web3.eth.get_transaction_count(addr, "pending")
+        with self._lock_for(addr):
+            self._nonces[addr] = nonce
+            self._save(addr, nonce)
+        print(f"🔄 {addr} resync nonce → {nonce}")
+        return nonce
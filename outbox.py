@@ -0,0 +1,322 @@
+"""Outbox ของ tx ที่ต้องส่งเข้า contract เก็บใน SQLite ตารางเดียวกับ energy_log
+
+meter loop แค่ enqueue() (insert ลง DB ในเครื่อง) แล้วไปต่อได้ทันที
+OutboxWorker ค่อยส่งเข้า chain เบื้องหลัง: จำกัดจำนวน tx ที่ค้างพร้อมกัน, retry แบบ exponential backoff
+และใช้ idempotency key (interval_id + action) กันส่งซ้ำ แม้ RPC ล่มหรือ process restart
+raw tx ที่ sign แล้วถูกบันทึก (status 'signed') ก่อน broadcast → restart กลางทางก็ส่ง tx ตัวเดิม ไม่ใช่ nonce ใหม่
+"""
+import json
+import time
+import sqlite3
+import threading
+
+from web3.exceptions import TransactionNotFound, TimeExhausted
+
+import helpers
+import relayer
+from config import monitor, REPORT_RELAYER
+from preflight import PreflightFailed
+
+ACTIONS = {
+    "reportEnergy": helpers.submit_report_energy,
+    "payEnergy": helpers.submit_pay_energy,
+    "resetEnergy": helpers.submit_reset_energy,
+    "claim": helpers.submit_claim,
+    "relayReport": relayer.submit_relayed_report,
+}
+
+
+# -------------------------------
+# DB
+# -------------------------------
+def init_outbox(db_path):
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tx_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idem_key TEXT UNIQUE,
+            interval_id INTEGER,
+            action TEXT,
+            args TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            tx_hash TEXT,
+            gas_used INTEGER,
+            last_error TEXT,
+            raw_tx TEXT,
+            nonce INTEGER,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # DB เก่าที่สร้างก่อนมี raw_tx / nonce
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(tx_outbox)")}
+    for column, sql_type in (("raw_tx", "TEXT"), ("nonce", "INTEGER")):
+        if column not in columns:
+            cur.execute(f"ALTER TABLE tx_outbox ADD COLUMN {column} {sql_type}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON tx_outbox (status, id)")
+    conn.commit()
+    conn.close()
+
+
+def enqueue(db_path, interval_id, action, args=(), idem_key=None):
+    """ฝาก contract call ไว้ใน outbox → True ถ้าเพิ่มใหม่, False ถ้ามี key นี้อยู่แล้ว"""
+    if action not in ACTIONS:
+        raise ValueError(f"ไม่รู้จัก action: {action}")
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT OR IGNORE INTO tx_outbox (idem_key, interval_id, action, args) VALUES (?, ?, ?, ?)",
+        (idem_key or f"{interval_id}:{action}", interval_id, action, json.dumps(list(args))),
+    )
+    conn.commit()
+    added = cur.rowcount == 1
+    conn.close()
+    return added
+
+
+def enqueue_report(db_path, interval_id, gen, con):
+    """รายงานพลังงานของรอบนี้: ผ่าน relayer ถ้าตั้ง REPORT_RELAYER ไว้ ไม่งั้นส่ง reportEnergy เอง"""
+    if REPORT_RELAYER:
+        # nonce ต้องมากกว่าครั้งก่อนเสมอ → ใช้เวลา (ms) ตอน enqueue (retry ใช้ค่าเดิมจาก DB)
+        return enqueue(db_path, interval_id, "relayReport", [gen, con, interval_id, int(time.time() * 1000)])
+    return enqueue(db_path, interval_id, "reportEnergy", [gen, con])
+
+
+def enqueue_exit(db_path, action):
+    """call ตอนออกจากโปรแกรม (resetEnergy / claim) ไม่ผูกกับ interval ใด
+
+    key ใช้เวลาที่ออก แต่มี prefix "exit-" แยกจาก key ของ interval (id ของ energy_log)
+    ไม่งั้นเวลาเป็นวินาทีอาจชนกับ id ของรอบใดรอบหนึ่ง → INSERT OR IGNORE ทิ้งไปเงียบๆ
+    """
+    return enqueue(db_path, None, action, idem_key=f"exit-{int(time.time())}:{action}")
+
+
+def outbox_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT status, COUNT(*) FROM tx_outbox GROUP BY status").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+# -------------------------------
+# Worker
+# -------------------------------
+class OutboxWorker:
+    def __init__(self, db_path, addr, pk, max_in_flight=4, poll_interval=2,
+                 base_delay=5, max_delay=300):
+        self.db_path = db_path
+        self.addr = addr
+        self.pk = pk
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _update(self, row_id, **fields):
+        conn = sqlite3.connect(self.db_path)
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        conn.execute(f"UPDATE tx_outbox SET {cols} WHERE id = ?", (*fields.values(), row_id))
+        conn.commit()
+        conn.close()
+
+    def _backoff(self, row_id, attempts, error):
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        self._update(
+            row_id,
+            status="pending",
+            attempts=attempts,
+            next_attempt_at=time.time() + delay,
+            last_error=str(error)[:500],
+        )
+        print(f"🔁 outbox #{row_id} ส่งไม่สำเร็จ ({error}) → ลองใหม่ใน {delay:.0f}s")
+
+    # -------------------------------
+    # ผลของ tx
+    # -------------------------------
+    def _watch(self, row_id, handle):
+        with self._lock:
+            self._in_flight[row_id] = handle
+        handle.add_done_callback(lambda h: self._on_done(row_id, h))
+
+    def _on_done(self, row_id, handle):
+        with self._lock:
+            self._in_flight.pop(row_id, None)
+        error = handle.exception()
+        if error is None:
+            receipt = handle.result()
+            if receipt["status"] == 0 and handle.gas_limit and receipt["gasUsed"] >= handle.gas_limit:
+                # out of gas → gas_model estimate ใหม่แล้ว ส่งซ้ำได้ (state ไม่เปลี่ยน)
+                self._backoff(row_id, 1, f"out of gas (limit {handle.gas_limit})")
+                self._wakeup.set()
+                return
+            status = "confirmed" if receipt["status"] == 1 else "reverted"
+            # tx_hash อาจเปลี่ยนเป็นตัวที่ accelerator ส่งแทน
+            self._update(row_id, status=status, gas_used=receipt["gasUsed"], tx_hash=handle.tx_hash)
+        elif isinstance(error, TimeExhausted):
+            self._on_timeout(row_id, handle)
+        else:
+            self._update(row_id, status="failed", last_error=str(error)[:500])
+        self._wakeup.set()
+
+    def _on_timeout(self, row_id, handle):
+        # tx เดิมหลุดจาก mempool ได้เพราะถูกส่งแทนด้วย fee สูงกว่า → ต้องไม่มี hash ไหนเลยที่ node รู้จัก ถึงส่งใหม่ได้
+        for tx_hash in handle.hashes:
+            try:
+                helpers.web3.eth.get_transaction(tx_hash)
+                break
+            except TransactionNotFound:
+                continue
+            except Exception:
+                break  # ถาม node ไม่ได้ → ไม่รู้สถานะ ห้ามส่งซ้ำ
+        else:
+            self._backoff(row_id, 1, "tx หลุดจาก mempool")
+            return
+        # ยังค้างอยู่ (หรือตัวที่ส่งแทนถูก mine แล้ว) → ตามทุก hash ต่อ และให้ accelerator เร่ง fee ต่อ ห้ามส่งซ้ำ
+        retracked = helpers.tracker.retrack(handle)
+        helpers.accelerator.rewatch(handle, retracked)
+        self._watch(row_id, retracked)
+
+    # -------------------------------
+    # Loop
+    # -------------------------------
+    def _journal(self, row_id, action):
+        """บันทึก raw tx ของ action นี้ก่อน broadcast (tx อื่นที่ส่งระหว่างทาง เช่น approve ไม่นับ)"""
+        def record(fn, raw_tx, tx_hash, nonce):
+            if fn == action:
+                self._update(row_id, status="signed", raw_tx="0x" + bytes(raw_tx).hex(), tx_hash=tx_hash, nonce=nonce)
+        return record
+
+    def _resume_signed(self):
+        """tx ที่ sign + บันทึกแล้วแต่ไม่รู้ว่า broadcast ทันหรือไม่ (process ตายกลางทาง) → ส่ง raw tx ตัวเดิมซ้ำ
+
+        คืน False ถ้ายังส่งไม่ได้ (RPC ล่ม) → ห้ามส่งแถวถัดไปก่อน เพื่อรักษาลำดับ nonce
+        """
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            "SELECT id, action, raw_tx, tx_hash, nonce FROM tx_outbox WHERE status = 'signed' ORDER BY id"
+        ).fetchall()
+        conn.close()
+        for row_id, action, raw_tx, tx_hash, nonce in rows:
+            try:
+                helpers.web3.eth.send_raw_transaction(raw_tx)
+            except Exception as e:
+                if not self._already_sent(tx_hash, nonce):
+                    print(f"⚠️ outbox #{row_id} ส่ง {action} ตัวเดิมซ้ำไม่สำเร็จ ({e}) → ลองใหม่รอบหน้า")
+                    return False
+            print(f"♻️ outbox #{row_id} ส่ง {action} ตัวเดิมซ้ำ tx={tx_hash}")
+            self._update(row_id, status="sent")
+            self._watch(row_id, helpers.tracker.track(tx_hash, f"{action} {self.addr}"))
+        return True
+
+    def _already_sent(self, tx_hash, nonce):
+        """ส่งซ้ำไม่ผ่านเพราะ tx นี้ไปถึง node แล้ว (อยู่ใน mempool / ถูก mine) หรือ nonce นี้ถูกใช้ไปแล้ว → True
+
+        nonce ถูกใช้ไปแล้วแต่ไม่ใช่ tx นี้ → tracker จะหมดเวลา แล้ว _on_timeout ส่งใหม่ให้เอง
+        """
+        try:
+            helpers.web3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            pass
+        except Exception:
+            return False
+        try:
+            return helpers.web3.eth.get_transaction_count(self.addr) > nonce
+        except Exception:
+            return False
+
+    def _resume_sent(self):
+        """หลัง restart: tx ที่ส่งไปแล้วแต่ยังไม่รู้ผล → ตามต่อจาก tx hash เดิม"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            "SELECT id, action, tx_hash FROM tx_outbox WHERE status = 'sent' ORDER BY id"
+        ).fetchall()
+        conn.close()
+        for row_id, action, tx_hash in rows:
+            self._watch(row_id, helpers.tracker.track(tx_hash, f"{action} {self.addr}"))
+
+    def drain_once(self):
+        """ส่ง tx ที่ถึงเวลาตามลำดับ id (หยุดที่ตัวแรกที่พลาด เพื่อรักษาลำดับ nonce)"""
+        if not monitor.available():
+            # RPC ล่ม → เก็บไว้ใน outbox ก่อน (ไม่นับเป็น attempt) ส่งต่อเมื่อ monitor เห็นว่ากลับมา
+            return 0
+        if not self._resume_signed():
+            return 0
+        with self._lock:
+            room = self.max_in_flight - len(self._in_flight)
+        if room <= 0:
+            return 0
+
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            """
+            SELECT id, action, args, attempts, next_attempt_at FROM tx_outbox
+            WHERE status = 'pending' ORDER BY id LIMIT ?
+            """,
+            (room,),
+        ).fetchall()
+        conn.close()
+
+        sent = 0
+        for row_id, action, args, attempts, next_attempt_at in rows:
+            if next_attempt_at > time.time():
+                break
+            try:
+                with helpers.journal(self._journal(row_id, action)):
+                    handle = ACTIONS[action](self.addr, self.pk, *json.loads(args))
+            except PreflightFailed as e:
+                # รู้ล่วงหน้าว่าจะ revert → ไม่ส่ง ไม่ต้อง retry
+                self._update(row_id, status="skipped", attempts=attempts + 1, last_error=e.reason)
+                print(f"⏭️ outbox #{row_id} ข้าม {action}: {e.reason}")
+                continue
+            except Exception as e:
+                self._backoff(row_id, attempts + 1, e)
+                break
+            self._update(row_id, status="sent", attempts=attempts + 1, tx_hash=handle.tx_hash, last_error=None)
+            self._watch(row_id, handle)
+            sent += 1
+        return sent
+
+    def _run(self):
+        self._resume_sent()
+        while not self._stop.is_set():
+            try:
+                self.drain_once()
+            except Exception as e:
+                print(f"⚠️ outbox worker: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """ปลุก worker ทันทีหลัง enqueue (ไม่ต้องรอ poll รอบถัดไป)"""
+        self._wakeup.set()
+
+    def wait_empty(self, timeout=60):
+        """รอจน outbox ไม่มีงานค้าง (ใช้ตอนปิดโปรแกรม) → True ถ้าว่างทันเวลา"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            counts = outbox_counts(self.db_path)
+            if not counts.get("pending") and not counts.get("signed") and not counts.get("sent"):
+                return True
+            self.notify()
+            time.sleep(1)
+        return False
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
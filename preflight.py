@@ -0,0 +1,120 @@
+"""จำลอง tx ด้วย eth_call (block "pending") ก่อนส่งจริง → ไม่เสีย gas ให้ tx ที่รู้อยู่แล้วว่าจะ revert
+
+ผลแคชต่อ block: ถ้าเหตุผลที่ revert เป็นสภาพของตลาดทั้งหมด (เช่นยังไม่มีผู้ขาย)
+ผู้ซื้อคนอื่นใน block เดียวกันใช้ผลนั้นเลยโดยไม่ต้องยิง eth_call ซ้ำ
+"""
+import re
+import threading
+
+from eth_utils import keccak
+from web3.exceptions import ContractLogicError
+
+# revert ที่ไม่ขึ้นกับผู้ส่ง → ใช้ผลร่วมกันทุก address ใน block เดียวกัน
+SHARED_REVERTS = ("No sellers available", "NoSellersAvailable")
+
+_SELECTOR = re.compile(r"0x[0-9a-fA-F]{8}")
+
+
+class PreflightFailed(Exception):
+    """eth_call บอกว่า tx นี้จะ revert"""
+
+    def __init__(self, fn, reason):
+        super().__init__(f"{fn} จะ revert: {reason}")
+        self.fn = fn
+        self.reason = reason
+
+
+def error_names(abi):
+    """selector ("0x" + 4 byte) → ชื่อ custom error ทุกตัวใน ABI"""
+    names = {}
+    for item in abi:
+        if item.get("type") == "error":
+            signature = f"{item['name']}({','.join(i['type'] for i in item.get('inputs', []))})"
+            names["0x" + keccak(text=signature)[:4].hex()] = item["name"]
+    return names
+
+
+def revert_reason(exc, errors=None):
+    """เหตุผลที่ revert: ข้อความของ require/revert string หรือชื่อ custom error (ถ้ารู้จัก selector)"""
+    msg = getattr(exc, "message", None) or str(exc)
+    if errors:
+        data = getattr(exc, "data", None)
+        for text in (data if isinstance(data, str) else "", msg):
+            match = _SELECTOR.search(text)
+            if match and match.group(0).lower() in errors:
+                return errors[match.group(0).lower()]
+    return msg.rsplit("execution reverted:", 1)[-1].strip() or "execution reverted"
+
+
+class Preflight:
+    def __init__(self, web3, current_block, errors=None):
+        self.web3 = web3
+        self._current_block = current_block  # callable → เลข block ล่าสุด (ใช้ของ read_cache ได้)
+        self.errors = errors or {}  # selector → ชื่อ custom error (ดู error_names)
+        self._block = None
+        self._results = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+
+    def _cached(self, block, keys):
+        with self._lock:
+            if block != self._block:
+                self._block = block
+                self._results.clear()
+            for key in keys:
+                if key in self._results:
+                    self.hits += 1
+                    return self._results[key]
+        return None
+
+    def _keys(self, call, sender):
+        return (call.to, call.name), (call.to, call.data, sender)
+
+    def _remember(self, block, keys, reason):
+        shared_key, own_key = keys
+        with self._lock:
+            if block == self._block:
+                self._results[shared_key if reason in SHARED_REVERTS else own_key] = reason
+
+    def check(self, call, sender):
+        """คืน None ถ้า tx ผ่าน หรือ raise PreflightFailed พร้อมเหตุผลที่ revert
+
+        error อื่นที่ไม่ใช่ revert (เช่น RPC ล่ม) → ปล่อยผ่าน ให้ส่ง tx ตามปกติ
+        """
+        block = self._current_block()
+        keys = self._keys(call, sender)
+        reason = self._cached(block, keys)
+        if reason is None:
+            try:
+                self.calls += 1
+                self.web3.eth.call({"from": sender, "to": call.to, "data": call.data}, "pending")
+                reason = ""
+            except ContractLogicError as e:
+                reason = revert_reason(e, self.errors)
+            except Exception as e:
+                print(f"⚠️ preflight {call.name} ไม่สำเร็จ ({e}) → ส่ง tx ตามปกติ")
+                return None
+            self._remember(block, keys, reason)
+        if reason:
+            raise PreflightFailed(call.name, reason)
+        return None
+
+    async def check_async(self, call, sender, async_web3, block):
+        """check สำหรับ event loop: eth_call ผ่าน async_web3 (block = เลข block ล่าสุดที่ผู้เรียกรู้)"""
+        keys = self._keys(call, sender)
+        reason = self._cached(block, keys)
+        if reason is None:
+            try:
+                self.calls += 1
+                await async_web3.eth.call({"from": sender, "to": call.to, "data": call.data}, "pending")
+                reason = ""
+            except ContractLogicError as e:
+                reason = revert_reason(e, self.errors)
+            except Exception as e:
+                print(f"⚠️ preflight {call.name} ไม่สำเร็จ ({e}) → ส่ง tx ตามปกติ")
+                return None
+            self._remember(block, keys, reason)
+        if reason:
+            raise PreflightFailed(call.name, reason)
+        return None
@@ -0,0 +1,100 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class BlockReadCache:
+    """แคชผล view call ต่อ block: (contract, function, args, block) → ผลลัพธ์
+
+    ค่า view เปลี่ยนได้เฉพาะตอนมี block ใหม่ ดังนั้นทุกคนที่ถามซ้ำใน block เดียวกัน
+    เสีย RPC แค่ครั้งเดียวต่อ call ที่ไม่ซ้ำกัน (LRU ตัดตัวเก่าเมื่อเกิน maxsize)
+    """
+
+    def __init__(self, web3, maxsize=512, head_ttl=3):
+        self.web3 = web3
+        self.maxsize = maxsize
+        self.head_ttl = head_ttl  # วินาทีที่เชื่อเลข block ล่าสุดโดยไม่ถาม node ใหม่
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._head = None
+        self._head_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------
+    # Block head
+    # -------------------------------
+    def _set_head(self, block):
+        with self._lock:
+            if block != self._head:
+                # block ใหม่ → ของเก่าใช้ไม่ได้แล้ว
+                self._entries.clear()
+                self._head = block
+            self._head_at = time.monotonic()
+
+    def current_block(self):
+        if self._head is None or time.monotonic() - self._head_at >= self.head_ttl:
+            self._set_head(self.web3.eth.block_number)
+        return self._head
+
+    async def current_block_async(self, async_web3):
+        """current_block สำหรับ event loop: ถาม node ผ่าน async_web3 เมื่อเลขที่รู้เก่าเกิน head_ttl"""
+        if self._head is None or time.monotonic() - self._head_at >= self.head_ttl:
+            self._set_head(await async_web3.eth.block_number)
+        return self._head
+
+    def _run(self, poll_interval):
+        failing = False
+        while not self._stop.is_set():
+            try:
+                self._set_head(self.web3.eth.block_number)
+                failing = False
+            except Exception as e:
+                # chain ล่มนาน → เตือนครั้งเดียว ไม่พิมพ์ทุก poll (monitor รายงานสถานะการเชื่อมต่ออยู่แล้ว)
+                if not failing:
+                    print(f"⚠️ read cache: อ่าน block ล่าสุดไม่ได้ ({e})")
+                failing = True
+            self._stop.wait(poll_interval)
+
+    def start(self, poll_interval=2):
+        """ติดตาม block ใหม่เบื้องหลัง แล้วล้างแคชทันทีที่ head เปลี่ยน"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.head_ttl = float("inf")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(poll_interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # -------------------------------
+    # Read-through
+    # -------------------------------
+    def call(self, fn):
+        """เหมือน fn.call() แต่ใช้ผลเดิมถ้าถามซ้ำใน block เดียวกัน"""
+        block = self.current_block()
+        args = tuple(tuple(a) if isinstance(a, list) else a for a in fn.args)
+        key = (fn.address, fn.abi["name"], args, block)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = fn.call(block_identifier=block)
+
+        with self._lock:
+            if block == self._head:
+                self._entries[key] = result
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
@@ -6,7 +6,8 @@ from dotenv import load_dotenv
 import minimalmodbus
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, reset_energy  # SELL_ONLY ไม่ต้องจ่าย pay_energy
+from helpers import submit_report_energy, reset_energy  # SELL_ONLY ไม่ต้องจ่าย pay_energy
+from config import monitor
 
 load_dotenv()
 
@@ -105,15 +106,21 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            # ✅ ส่งทุกครั้ง แม้ delta_gen = 0
-            gen_int = int(delta_gen * SCALE)
-            report_energy(ADDRESS, PRIVATE_KEY, gen_int, 0)
-
-            if delta_gen == 0:
-                print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
-            else:
-                print(f"📡 ส่ง delta_gen = {gen_int}")
+            try:
+                # ✅ ส่งทุกครั้ง แม้ delta_gen = 0
+                gen_int = int(delta_gen * SCALE)
+                submit_report_energy(ADDRESS, PRIVATE_KEY, gen_int, 0)
+
+                if delta_gen == 0:
+                    print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
+                else:
+                    print(f"📡 ส่ง delta_gen = {gen_int}")
+            except Exception as e:
+                # RPC error / nonce / tx ล้ม → ข้ามรอบนี้ แต่ loop ต้องวิ่งต่อ (ค่ามิเตอร์อยู่ใน DB แล้ว)
+                print(f"❌ ส่ง tx รอบนี้ไม่สำเร็จ: {e}")
 
         time.sleep(300)
 
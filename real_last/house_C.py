@@ -6,7 +6,9 @@ from dotenv import load_dotenv
 import minimalmodbus
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, pay_energy, reset_energy
+from helpers import submit_report_energy, submit_pay_energy, reset_energy
+from config import monitor
+from preflight import PreflightFailed
 
 load_dotenv()
 
@@ -135,12 +137,21 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            report_energy(ADDRESS, PRIVATE_KEY, gen_int, con_int)
-            if net < 0:
-                pay_energy(ADDRESS, PRIVATE_KEY, int(abs(net)*SCALE))
-            elif net==0:
-                print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
+            try:
+                submit_report_energy(ADDRESS, PRIVATE_KEY, gen_int, con_int)
+                if net < 0:
+                    try:
+                        submit_pay_energy(ADDRESS, PRIVATE_KEY, int(abs(net)*SCALE))
+                    except PreflightFailed as e:
+                        print(f"⏭️ ข้ามการซื้อรอบนี้: {e.reason}")
+                elif net==0:
+                    print("ℹ️ บ้านไม่ได้ผลิต → supply บ้านนี้ = 0")
+            except Exception as e:
+                # RPC error / nonce / tx ล้ม → ข้ามรอบนี้ แต่ loop ต้องวิ่งต่อ (ค่ามิเตอร์อยู่ใน DB แล้ว)
+                print(f"❌ ส่ง tx รอบนี้ไม่สำเร็จ: {e}")
 
         time.sleep(300)
 
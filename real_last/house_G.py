@@ -6,7 +6,9 @@ from dotenv import load_dotenv
 import minimalmodbus
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from helpers import report_energy, pay_energy, reset_energy
+from helpers import submit_report_energy, submit_pay_energy, reset_energy
+from config import monitor
+from preflight import PreflightFailed
 
 load_dotenv()
 
@@ -90,12 +92,21 @@ try:
         if is_first_run:
             print("⏩ ข้ามรอบแรก (baseline)")
             is_first_run = False
+        elif not monitor.available():
+            print("⚠️ ต่อ chain ไม่ได้ → บันทึกลง DB อย่างเดียว ไม่ส่งรอบนี้")
         else:
-            report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
-            if delta_con>0:
-                pay_energy(ADDRESS, PRIVATE_KEY, con_int)
-            elif delta_con==0:
-                print("ℹ️ ไม่มีการใช้ไฟเพิ่ม → ไม่ซื้อ/จ่าย")
+            try:
+                submit_report_energy(ADDRESS, PRIVATE_KEY, 0, con_int)
+                if delta_con>0:
+                    try:
+                        submit_pay_energy(ADDRESS, PRIVATE_KEY, con_int)
+                    except PreflightFailed as e:
+                        print(f"⏭️ ข้ามการซื้อรอบนี้: {e.reason}")
+                elif delta_con==0:
+                    print("ℹ️ ไม่มีการใช้ไฟเพิ่ม → ไม่ซื้อ/จ่าย")
+            except Exception as e:
+                # RPC error / nonce / tx ล้ม → ข้ามรอบนี้ แต่ loop ต้องวิ่งต่อ (ค่ามิเตอร์อยู่ใน DB แล้ว)
+                print(f"❌ ส่ง tx รอบนี้ไม่สำเร็จ: {e}")
 
         time.sleep(300)
 
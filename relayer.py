@@ -0,0 +1,246 @@
+"""Relayer: รวม reportEnergy ของหลายบ้านเป็น batchReport tx เดียว
+
+แต่ละบ้านเซ็นรายงาน (EIP-712, ดู attestation.py) แล้วส่งมาทาง socket ในเครื่อง (REPORT_RELAYER=host:port)
+relayer ตรวจลายเซ็น + nonce แล้วรวมไว้ ส่งเป็น batchReport ทุก RELAYER_BATCH_WINDOW วินาที (หรือครบ RELAYER_MAX_BATCH)
+จ่าย gas ครั้งเดียวด้วย key ของ relayer แทนที่ทุกบ้านต้องส่ง tx / จ่าย fee / รอ receipt เอง
+
+    python relayer.py            # ใช้ RELAYER_ADDRESS / RELAYER_PK จาก .env
+
+โปรโตคอล: JSON หนึ่งบรรทัดต่อรายงาน {"report": {...}, "signature": "0x..."}
+ตอบกลับเมื่อ batch ที่มีรายงานนี้ถูกส่งแล้ว {"tx_hash": ..., "gas_limit": ...} หรือ {"error": ..., "rejected": true/false}
+แล้วตอบอีกบรรทัดเมื่อ batch จบ {"hashes": [...]} (รวม hash ที่ส่งแทนด้วย fee สูงกว่า → บ้านตามต่อได้)
+"""
+import os
+import json
+import socket
+import threading
+import socketserver
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+import helpers
+from web3.logs import DISCARD
+
+from attestation import make_report, sign_report, recover_signer, REPORT_FIELDS
+from config import REPORT_RELAYER, RELAYER_BATCH_WINDOW, RELAYER_MAX_BATCH, market_contract, read_cache
+from preflight import PreflightFailed
+
+load_dotenv()
+
+RELAYER_ADDRESS = os.getenv("RELAYER_ADDRESS")
+RELAYER_PK = os.getenv("RELAYER_PK")
+
+
+class ReportRejected(ValueError):
+    """รายงานใช้ไม่ได้ (ลายเซ็นผิด / nonce เก่า) → ส่งซ้ำกี่ครั้งก็ไม่ผ่าน"""
+
+
+def _split_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# -------------------------------
+# ฝั่ง relayer
+# -------------------------------
+class ReportRelayer:
+    def __init__(self, addr, pk, window=RELAYER_BATCH_WINDOW, max_batch=RELAYER_MAX_BATCH):
+        self.addr = addr
+        self.pk = pk
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.reports = 0
+
+        self._pending = {}  # house → (report, signature, [Future ของผู้ส่ง])
+        self._sent_nonces = {}  # house → nonce ล่าสุดที่ใช้บน chain แล้ว (read_cache อาจยังเห็น block ก่อน batch)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, report, signature):
+        """ตรวจรายงานแล้วรอเข้า batch ถัดไป → Future ที่ได้ TxHandle ของ batchReport เมื่อส่งแล้ว"""
+        report = make_report(to_checksum_address(report["house"]), *(report[f] for f in REPORT_FIELDS[1:]))
+        house = report["house"]
+        if recover_signer(report, signature) != house:
+            raise ReportRejected(f"ลายเซ็นไม่ใช่ของ {house}")
+        last_nonce = max(
+            read_cache.call(market_contract.functions.reportNonces(house)), self._sent_nonces.get(house, 0)
+        )
+        if report["nonce"] <= last_nonce:
+            raise ReportRejected(f"nonce {report['nonce']} ไม่มากกว่าที่ใช้ไปแล้ว ({last_nonce})")
+
+        future = Future()
+        with self._lock:
+            current = self._pending.get(house)
+            if current and current[0]["nonce"] >= report["nonce"]:
+                raise ReportRejected(f"มีรายงานของ {house} ที่ใหม่กว่ารออยู่แล้ว")
+            # รายงานใหม่กว่าแทนที่ตัวเก่าใน batch เดียวกัน (ผู้ส่งตัวเก่าได้ tx เดียวกัน)
+            futures = current[2] if current else []
+            futures.append(future)
+            self._pending[house] = (report, signature, futures)
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wakeup.set()
+        return future
+
+    def flush(self):
+        """ส่งรายงานที่รออยู่ทั้งหมดเป็น batchReport (ไม่มี → None)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return None
+        items = list(pending.values())
+        try:
+            handle = helpers.submit_batch_report(
+                self.addr, self.pk, [report for report, _, _ in items], [sig for _, sig, _ in items]
+            )
+        except Exception as e:
+            print(f"❌ ส่ง batchReport ไม่สำเร็จ: {e}")
+            for _, _, futures in items:
+                for future in futures:
+                    future.set_exception(e)
+            return None
+        self.batches += 1
+        self.reports += len(items)
+        handle.add_done_callback(lambda h: self._on_batch_done([report for report, _, _ in items], h))
+        for _, _, futures in items:
+            for future in futures:
+                future.set_result(handle)
+        return handle
+
+    def _on_batch_done(self, reports, handle):
+        # จำ nonce เฉพาะรายงานที่ contract ใช้จริง: batch revert / out of gas → บ้านส่งรายงานเดิมซ้ำได้
+        if handle.exception() is not None or handle.result()["status"] != 1:
+            return
+        events = market_contract.events.ReportRejected().process_receipt(handle.result(), errors=DISCARD)
+        rejected = {(ev["args"]["house"], ev["args"]["nonce"]) for ev in events}
+        with self._lock:
+            for report in reports:
+                house, nonce = report["house"], report["nonce"]
+                if (house, nonce) not in rejected and nonce > self._sent_nonces.get(house, 0):
+                    self._sent_nonces[house] = nonce
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.window)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ relayer: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def handle_message(self, message):
+        """ข้อความ 1 บรรทัดจาก socket → (คำตอบ (dict), TxHandle ของ batch หรือ None)"""
+        try:
+            future = self.add(message["report"], message["signature"])
+        except ReportRejected as e:
+            return {"error": str(e), "rejected": True}, None
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"ข้อความไม่ถูกต้อง: {e}", "rejected": True}, None
+        except Exception as e:
+            return {"error": str(e), "rejected": False}, None
+        try:
+            handle = future.result(timeout=self.window + 60)
+        except Exception as e:
+            return {"error": str(e), "rejected": False}, None
+        return {"tx_hash": handle.tx_hash, "gas_limit": handle.gas_limit}, handle
+
+    def serve(self, address=REPORT_RELAYER or "127.0.0.1:8765"):
+        relayer = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply, handle = relayer.handle_message(json.loads(line))
+                    except ValueError as e:
+                        reply, handle = {"error": f"JSON ไม่ถูกต้อง: {e}", "rejected": True}, None
+                    self.wfile.write(json.dumps(reply).encode() + b"\n")
+                    if handle is not None:
+                        # รอ batch จบ แล้วบอก hash ทั้งหมด (tx เดิมอาจถูกส่งแทนด้วย fee สูงกว่า)
+                        try:
+                            handle.exception()
+                        finally:
+                            self.wfile.write(json.dumps({"hashes": handle.hashes}).encode() + b"\n")
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer(_split_address(address), Handler)
+        server.daemon_threads = True
+        self.start()
+        print(f"📮 relayer {self.addr} รับรายงานที่ {address} (batch ทุก {self.window}s / สูงสุด {self.max_batch} บ้าน)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("🚪 ปิด relayer → ส่งรายงานที่ค้าง")
+        finally:
+            server.server_close()
+            self.stop()
+            self.flush()
+
+
+# -------------------------------
+# ฝั่งบ้าน
+# -------------------------------
+def submit_relayed_report(addr, pk, gen, con, interval, nonce, relayer=None):
+    """เซ็นรายงานแล้วส่งให้ relayer → TxHandle ของ batchReport ที่มีรายงานนี้อยู่
+
+    raise PreflightFailed ถ้า relayer ไม่รับรายงาน (ส่งซ้ำก็ไม่ผ่าน → outbox ข้ามไป)
+    """
+    report = make_report(addr, gen, con, interval, nonce)
+    message = {"report": report, "signature": sign_report(pk, report)}
+    sock = socket.create_connection(_split_address(relayer or REPORT_RELAYER), timeout=RELAYER_BATCH_WINDOW + 90)
+    try:
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        replies = sock.makefile("r")
+        reply = json.loads(replies.readline() or "{}")
+    except Exception:
+        sock.close()
+        raise
+    if "tx_hash" not in reply:
+        sock.close()
+        if reply.get("rejected"):
+            raise PreflightFailed("batchReport", reply["error"])
+        raise RuntimeError(f"relayer: {reply.get('error', 'ไม่มีคำตอบ')}")
+
+    handle = helpers.tracker.track(HexBytes(reply["tx_hash"]), f"batchReport {addr}", house=addr, fn="batchReport")
+    handle.gas_limit = reply.get("gas_limit")
+    threading.Thread(target=_follow_replacements, args=(sock, replies, handle), daemon=True).start()
+    print(f"📡 {addr} รายงาน Energy ผ่าน relayer → ผลิต {gen}, ใช้ {con}, tx={handle.tx_hash}")
+    return handle
+
+
+def _follow_replacements(sock, replies, handle):
+    """รอบรรทัดที่ 2 จาก relayer (hash ทั้งหมดของ batch) แล้วผูก hash ที่ส่งแทนเข้ากับ handle ของบ้าน"""
+    try:
+        sock.settimeout(helpers.tracker.timeout + 60)
+        line = replies.readline()
+        for tx_hash in json.loads(line).get("hashes", []) if line else []:
+            helpers.tracker.replace(handle, HexBytes(tx_hash))
+    except Exception as e:
+        print(f"⚠️ ไม่ได้รับ hash ที่ relayer ส่งแทน ({e}) → ตาม tx เดิมต่อ")
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    if not RELAYER_ADDRESS or not RELAYER_PK:
+        raise SystemExit("❌ ต้องตั้ง RELAYER_ADDRESS / RELAYER_PK ใน .env")
+    ReportRelayer(RELAYER_ADDRESS, RELAYER_PK).serve()
@@ -0,0 +1,141 @@
+import threading
+
+from eth_utils import get_abi_input_types, get_abi_output_types
+
+
+class BatchResult:
+    """ค่าที่จะได้หลัง batch ถูกส่ง → อ่านผ่าน .value"""
+
+    def __init__(self, method, params, formatter):
+        self.method = method
+        self.params = params
+        self.formatter = formatter
+        self._value = None
+        self._error = None
+        self._done = False
+
+    def _set(self, response):
+        self._done = True
+        if "error" in response:
+            self._error = response["error"]
+        else:
+            try:
+                self._value = self.formatter(response.get("result"))
+            except Exception as e:
+                self._error = e
+
+    @property
+    def value(self):
+        if not self._done:
+            raise RuntimeError("batch ยังไม่ถูกส่ง (ออกจาก with ก่อนอ่านค่า)")
+        if self._error is not None:
+            raise ValueError(self._error)
+        return self._value
+
+
+class BatchRefused(Exception):
+    """endpoint ตอบ batch กลับมาเป็น error ก้อนเดียว (ไม่ใช่ list ตามจำนวน request) = ไม่รองรับ batch"""
+
+
+def _to_int(result):
+    return int(result, 16) if isinstance(result, str) else int(result)
+
+
+class ReadBatch:
+    """รวม read หลายตัวในรอบเดียวเป็น JSON-RPC batch request เดียว
+
+        with batch_reads() as batch:
+            nonce = batch.nonce(addr)
+            price = batch.gas_price()
+            allowance = batch.call(token_contract.functions.allowance(addr, MARKET_ADDRESS))
+        print(nonce.value, price.value, allowance.value)
+
+    ถ้า endpoint ไม่รับ batch จะส่งทีละ request แทนอัตโนมัติ
+    """
+
+    # endpoint ที่เคยปฏิเสธ batch แล้ว → ไม่ต้องลองซ้ำ
+    _unsupported = set()
+    _unsupported_lock = threading.Lock()
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+
+    # -------------------------------
+    # คำสั่งที่รองรับ
+    # -------------------------------
+    def raw(self, method, params, formatter=lambda r: r):
+        result = BatchResult(method, params, formatter)
+        self._results.append(result)
+        return result
+
+    def nonce(self, addr, block="pending"):
+        return self.raw("eth_getTransactionCount", [addr, block], _to_int)
+
+    def gas_price(self):
+        return self.raw("eth_gasPrice", [], _to_int)
+
+    def balance(self, addr, block="latest"):
+        return self.raw("eth_getBalance", [addr, block], _to_int)
+
+    def block_number(self):
+        return self.raw("eth_blockNumber", [], _to_int)
+
+    def call(self, fn, block="latest"):
+        """eth_call ของ contract function เช่น token_contract.functions.balanceOf(addr)"""
+        codec = self.web3.codec
+        data = fn.selector + codec.encode(get_abi_input_types(fn.abi), fn.args).hex()
+        output_types = get_abi_output_types(fn.abi)
+
+        def decode(result):
+            values = codec.decode(output_types, bytes.fromhex(result[2:]))
+            return values[0] if len(values) == 1 else values
+
+        return self.raw("eth_call", [{"to": fn.address, "data": data}, block], decode)
+
+    # -------------------------------
+    # ส่ง
+    # -------------------------------
+    def _endpoint(self):
+        return getattr(self.web3.provider, "endpoint_uri", None) or id(self.web3.provider)
+
+    def _send_batch(self, pending):
+        responses = self.web3.provider.make_batch_request(
+            [(r.method, r.params) for r in pending]
+        )
+        if not isinstance(responses, list) or len(responses) != len(pending):
+            # endpoint ตอบ error ก้อนเดียว = ไม่รองรับ batch
+            raise BatchRefused(responses)
+        for r, response in zip(pending, responses):
+            r._set(response)
+
+    def execute(self):
+        pending = [r for r in self._results if not r._done]
+        if not pending:
+            return self._results
+        endpoint = self._endpoint()
+
+        if len(pending) > 1 and endpoint not in ReadBatch._unsupported:
+            try:
+                self._send_batch(pending)
+                return self._results
+            except Exception as e:
+                if isinstance(e, BatchRefused) or "batch" in str(e).lower():
+                    # endpoint / provider ปฏิเสธ batch เอง → จำไว้ ไม่ต้องลองซ้ำ
+                    print(f"⚠️ endpoint ไม่รับ JSON-RPC batch → ส่งทีละ request ({e})")
+                    with ReadBatch._unsupported_lock:
+                        ReadBatch._unsupported.add(endpoint)
+                else:
+                    # timeout / connection หลุด ฯลฯ → ส่งทีละ request เฉพาะรอบนี้ รอบหน้าลอง batch ใหม่
+                    print(f"⚠️ JSON-RPC batch ไม่สำเร็จรอบนี้ → ส่งทีละ request ({e})")
+
+        for r in pending:
+            r._set(self.web3.provider.make_request(r.method, r.params))
+        return self._results
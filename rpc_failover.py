@@ -0,0 +1,263 @@
+import time
+import asyncio
+import threading
+
+import aiohttp
+import requests
+from eth_account import Account
+from web3 import AsyncHTTPProvider
+from web3.providers.base import BaseProvider
+from web3.providers.async_base import AsyncBaseProvider
+
+from rpc_provider import RpcStats, RETRY_ERRORS, READ_METHODS, HTTP2_AVAILABLE, make_provider
+
+# error ที่แปลว่า node นี้ใช้ไม่ได้ตอนนี้ → ย้ายไป node ถัดไป
+FAILOVER_ERRORS = RETRY_ERRORS + (requests.HTTPError,)
+if HTTP2_AVAILABLE:
+    import httpx
+
+    # ส่งผ่าน HTTP/2 (httpx) → HTTP 429 / 5xx มาเป็น HTTPStatusError แทน requests.HTTPError
+    FAILOVER_ERRORS += (httpx.HTTPStatusError,)
+# ฝั่ง async (aiohttp): ClientError รวม connection error และ HTTP status error แล้ว
+ASYNC_FAILOVER_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# tx ของ address เดียวกันต้องไปที่ node เดียวกัน (ลำดับ nonce ใน mempool ไม่สลับ)
+WRITE_METHODS = frozenset({"eth_sendRawTransaction", "eth_sendTransaction"})
+
+
+class Endpoint:
+    def __init__(self, uri, provider):
+        self.uri = uri
+        self.provider = provider
+        self.healthy = True
+        self.latency = None  # วินาที (ค่าเฉลี่ยแบบ EWMA)
+        self.block = None
+
+    def observe(self, seconds):
+        self.latency = seconds if self.latency is None else 0.7 * self.latency + 0.3 * seconds
+
+    def __repr__(self):
+        latency = "-" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"<Endpoint {self.uri} healthy={self.healthy} latency={latency} block={self.block}>"
+
+
+class FailoverProvider(BaseProvider):
+    """provider หลาย endpoint: read ไป node ที่เร็วสุด, write ปักหมุด node ต่อ address
+
+    node ที่ error / block ตามหลังเกิน max_block_lag จะถูกพักไว้จนกว่า health check จะผ่าน
+    """
+
+    def __init__(self, endpoint_uris, health_interval=15, max_block_lag=5, stats=None, **provider_kwargs):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("ต้องมี RPC endpoint อย่างน้อย 1 ตัว")
+        self.stats = stats or RpcStats()
+        self.endpoints = [
+            Endpoint(uri, make_provider(uri, stats=self.stats, **provider_kwargs))
+            for uri in endpoint_uris
+        ]
+        self.health_interval = health_interval
+        self.max_block_lag = max_block_lag
+        self._pins = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __str__(self):
+        return f"Failover RPC {[ep.uri for ep in self.endpoints]}"
+
+    # -------------------------------
+    # Health check
+    # -------------------------------
+    def check_health(self):
+        for ep in self.endpoints:
+            start = time.perf_counter()
+            try:
+                response = ep.provider.make_request("eth_blockNumber", [])
+                result = response["result"]
+                ep.block = int(result, 16) if isinstance(result, str) else int(result)
+                ep.observe(time.perf_counter() - start)
+            except Exception:
+                ep.block = None
+
+        best_block = max((ep.block for ep in self.endpoints if ep.block is not None), default=None)
+        for ep in self.endpoints:
+            healthy = ep.block is not None and best_block - ep.block <= self.max_block_lag
+            if healthy != ep.healthy:
+                print(f"{'✅' if healthy else '⚠️'} RPC {ep.uri} {'กลับมาใช้งานได้' if healthy else 'ใช้งานไม่ได้'}")
+            ep.healthy = healthy
+        return self.endpoints
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"⚠️ RPC health check: {e}")
+            self._stop.wait(self.health_interval)
+
+    def start(self):
+        """เริ่ม thread health check เบื้องหลัง"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # -------------------------------
+    # Routing
+    # -------------------------------
+    def ranked(self):
+        """node ที่ใช้ได้เรียงตาม latency (ยังไม่มีค่า = ลำดับเดิม) แล้วตามด้วย node ที่ล่ม"""
+        healthy = [ep for ep in self.endpoints if ep.healthy]
+        down = [ep for ep in self.endpoints if not ep.healthy]
+        healthy.sort(key=lambda ep: float("inf") if ep.latency is None else ep.latency)
+        return healthy + down
+
+    def pinned(self, addr):
+        """node ประจำของ addr (ย้ายไป node ที่ดีที่สุดถ้า node เดิมล่ม)"""
+        key = addr.lower()
+        with self._lock:
+            ep = self._pins.get(key)
+            if ep is None or not ep.healthy:
+                new_ep = self.ranked()[0]
+                if ep is not None and new_ep is not ep:
+                    print(f"🔀 {addr} ย้าย RPC {ep.uri} → {new_ep.uri}")
+                self._pins[key] = ep = new_ep
+            return ep
+
+    def _sender(self, method, params):
+        if method == "eth_sendRawTransaction":
+            return Account.recover_transaction(params[0])
+        if method == "eth_sendTransaction":
+            return params[0].get("from")
+        if method == "eth_getTransactionCount" and len(params) > 1 and params[1] == "pending":
+            return params[0]
+        return None
+
+    def _candidates(self, method, params):
+        ranked = self.ranked()
+        sender = self._sender(method, params)
+        if sender is None:
+            return ranked
+        pin = self.pinned(sender)
+        return [pin] + [ep for ep in ranked if ep is not pin]
+
+    def _mark_down(self, ep, exc):
+        if ep.healthy:
+            print(f"⚠️ RPC {ep.uri} ใช้งานไม่ได้ ({type(exc).__name__}) → ลอง node ถัดไป")
+        ep.healthy = False
+
+    def _dispatch(self, candidates, call):
+        last_error = None
+        for ep in candidates:
+            start = time.perf_counter()
+            try:
+                response = call(ep.provider)
+                ep.observe(time.perf_counter() - start)
+                return response
+            except FAILOVER_ERRORS as e:
+                self._mark_down(ep, e)
+                last_error = e
+        raise last_error
+
+    def make_request(self, method, params):
+        return self._dispatch(
+            self._candidates(method, params),
+            lambda provider: provider.make_request(method, params),
+        )
+
+    def make_batch_request(self, batch_requests):
+        return self._dispatch(
+            self.ranked(),
+            lambda provider: provider.make_batch_request(batch_requests),
+        )
+
+    def is_connected(self, show_traceback=False):
+        return any(ep.healthy for ep in self.check_health())
+
+
+class AsyncFailoverProvider(AsyncBaseProvider):
+    """คู่ async ของ FailoverProvider สำหรับ helpers_async
+
+    ใช้ endpoint ชุดเดียวกัน (สถานะ health / latency / node ประจำของ address) RpcStats และ TokenBucket ตัวเดียวกัน
+    แต่ยิงด้วย AsyncHTTPProvider → event loop ไม่ต้องรอ thread
+    """
+
+    def __init__(self, failover, timeout=10, retries=2, backoff=0.25):
+        super().__init__()
+        self.failover = failover
+        self.stats = failover.stats
+        self.retries = retries
+        self.backoff = backoff
+        self._providers = {
+            ep.uri: AsyncHTTPProvider(
+                ep.uri,
+                request_kwargs={"timeout": aiohttp.ClientTimeout(total=timeout)},
+                exception_retry_configuration=None,
+            )
+            for ep in failover.endpoints
+        }
+
+    def __str__(self):
+        return f"Async {self.failover}"
+
+    async def _timed(self, ep, label, call, attempts, cost=1):
+        limiter = getattr(ep.provider, "limiter", None)
+        for i in range(attempts):
+            # ถัง token เดียวกับ provider ฝั่ง thread ของ endpoint นี้ → รวมอัตราทุก process ในเครื่อง
+            if limiter is not None:
+                await limiter.acquire_async(cost)
+            start = time.perf_counter()
+            try:
+                response = await call()
+                self.stats.record(label, time.perf_counter() - start)
+                return response
+            except ASYNC_FAILOVER_ERRORS:
+                self.stats.record(label, time.perf_counter() - start, error=True)
+                if i == attempts - 1:
+                    raise
+                await asyncio.sleep(self.backoff * 2**i)
+
+    async def _dispatch(self, candidates, label, call, read_only, cost=1):
+        attempts = self.retries + 1 if read_only else 1
+        last_error = None
+        for ep in candidates:
+            provider = self._providers[ep.uri]
+            start = time.perf_counter()
+            try:
+                response = await self._timed(ep, label, lambda: call(provider), attempts, cost)
+                ep.observe(time.perf_counter() - start)
+                return response
+            except ASYNC_FAILOVER_ERRORS as e:
+                self.failover._mark_down(ep, e)
+                last_error = e
+        raise last_error
+
+    async def make_request(self, method, params):
+        return await self._dispatch(
+            self.failover._candidates(method, params), method,
+            lambda provider: provider.make_request(method, params),
+            method in READ_METHODS,
+        )
+
+    async def make_batch_request(self, batch_requests):
+        response = await self._dispatch(
+            self.failover.ranked(), f"batch[{len(batch_requests)}]",
+            lambda provider: provider.make_batch_request(batch_requests),
+            {method for method, _ in batch_requests} <= READ_METHODS,
+            cost=len(batch_requests),
+        )
+        if not isinstance(response, list):
+            return response
+        return sorted(response, key=lambda r: r.get("id") or 0)
+
+    async def is_connected(self, show_traceback=False):
+        return any(ep.healthy for ep in self.failover.endpoints)
+
+    async def disconnect(self):
+        for provider in self._providers.values():
+            await provider.disconnect()
@@ -0,0 +1,179 @@
+"""จำกัดอัตรา RPC รวมทุก process ในเครื่อง + รวม read ที่ซ้ำกันพร้อมกันเป็น request เดียว
+
+บ้าน 7 หลัง + dashboard 7 ตัวยิง public RPC ตัวเดียวกัน และมักยิงพร้อมกันตอนรอบ 5 นาที → โดน throttle
+- TokenBucket: สถานะ (token ที่เหลือ, เวลาล่าสุด) เก็บในไฟล์เล็กๆ ที่ล็อกก่อนอ่าน/เขียน → ทุก process ใช้ถังเดียวกัน
+- SingleFlight: thread ที่ถามสิ่งเดียวกันขณะที่ request แรกยังไม่กลับ → รอผลของ request นั้นแทนการยิงซ้ำ
+"""
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+
+    msvcrt = None
+except ImportError:  # Windows
+    import msvcrt
+
+    fcntl = None
+
+_STATE_SIZE = 64
+
+
+class TokenBucket:
+    """token bucket ข้าม process: เติม rate token ต่อวินาที สะสมได้ไม่เกิน burst
+
+    rate <= 0 → ไม่จำกัด (acquire คืนทันที)
+    """
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = max(1, int(burst))
+        self.waits = 0
+        self.waited = 0.0  # วินาทีที่รอ token รวมทั้งหมด (ของ process นี้)
+
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    @contextmanager
+    def _locked(self):
+        # thread ใน process เดียวกันใช้ fd เดียวกัน (flock ไม่กันกันเอง) → ต้องมี lock ของ process ด้วย
+        with self._lock:
+            fd = self._open()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK ลอง 10 ครั้งแล้วยอมแพ้ → ลองต่อ
+            try:
+                yield fd
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _read(self, fd, now):
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            tokens, last = (float(x) for x in os.read(fd, _STATE_SIZE).split())
+        except ValueError:
+            # ไฟล์ใหม่ (หรือเสีย) → เริ่มด้วยถังเต็ม
+            return float(self.burst), now
+        return tokens, min(last, now)
+
+    def _write(self, fd, tokens, now):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, f"{tokens:.6f} {now:.6f}".ljust(_STATE_SIZE).encode())
+
+    def _take(self, cost):
+        """หัก token ถ้าพอ → 0 ไม่งั้นคืนเวลาที่ต้องรอ (วินาที)"""
+        with self._locked() as fd:
+            now = time.time()  # นาฬิกาเดียวกันทุก process
+            tokens, last = self._read(fd, now)
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= cost:
+                self._write(fd, tokens - cost, now)
+                return 0.0
+            self._write(fd, tokens, now)
+            return (cost - tokens) / self.rate
+
+    def acquire(self, cost=1):
+        """รอจนได้ token ครบ cost (batch ใหญ่เกิน burst นับเท่า burst)"""
+        if self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.burst)
+        waited = 0.0
+        while True:
+            wait = self._take(cost)
+            if wait <= 0:
+                break
+            waited += wait
+            time.sleep(wait)
+        if waited:
+            self.waits += 1
+            self.waited += waited
+        return waited
+
+    async def acquire_async(self, cost=1):
+        """acquire สำหรับ event loop: รอด้วย asyncio.sleep แทน time.sleep (ถังเดียวกับฝั่ง thread)"""
+        if self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.burst)
+        waited = 0.0
+        while True:
+            wait = self._take(cost)
+            if wait <= 0:
+                break
+            waited += wait
+            await asyncio.sleep(wait)
+        if waited:
+            self.waits += 1
+            self.waited += waited
+        return waited
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """เรียก fn ที่ key เดียวกันพร้อมกัน → ทำจริงครั้งเดียว คนอื่นรอแล้วได้ผล (หรือ error) เดียวกัน
+
+    ไม่แคชหลัง request จบ (แคชต่อ block อยู่ที่ read_cache.BlockReadCache)
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return dict(flight.result) if isinstance(flight.result, dict) else flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+from rpc_limit import TokenBucket, SingleFlight
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx ต้องมี h2 ถึงจะคุย HTTP/2 ได้)
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# method ที่อ่านอย่างเดียว → retry ได้ปลอดภัยเมื่อ connection หลุด/timeout
+READ_METHODS = frozenset({
+    "eth_blockNumber",
+    "eth_call",
+    "eth_chainId",
+    "eth_estimateGas",
+    "eth_feeHistory",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getLogs",
+    "eth_getTransactionByHash",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_maxPriorityFeePerGas",
+    "net_version",
+    "web3_clientVersion",
+})
+
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+if HTTP2_AVAILABLE:
+    RETRY_ERRORS += (httpx.TransportError,)
+
+
+class RpcStats:
+    """นับจำนวน request / error / latency แยกตาม RPC method"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, seconds, error=False):
+        with self._lock:
+            s = self._stats.setdefault(
+                method, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            ms = seconds * 1000
+            s["count"] += 1
+            s["errors"] += int(error)
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                method: dict(s, avg_ms=s["total_ms"] / s["count"])
+                for method, s in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        lines = [f"{'method':<28}{'count':>7}{'errors':>8}{'avg ms':>10}{'max ms':>10}"]
+        for method, s in sorted(self.snapshot().items(), key=lambda kv: -kv[1]["total_ms"]):
+            lines.append(
+                f"{method:<28}{s['count']:>7}{s['errors']:>8}{s['avg_ms']:>10.1f}{s['max_ms']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider ที่ใช้ session/connection pool เดียวร่วมกันทุก thread (keep-alive)
+
+    - HTTP/2 ผ่าน httpx ถ้าติดตั้ง httpx[http2] ไว้
+    - timeout ต่อ request และ retry เฉพาะ READ_METHODS
+    - เก็บสถิติต่อ method ไว้ใน self.stats
+    - limiter (TokenBucket) คุมอัตราทุก HTTP request, single_flight รวม read ที่ซ้ำกันพร้อมกัน
+    """
+
+    def __init__(self, endpoint_uri, pool_size=20, timeout=10, retries=2,
+                 backoff=0.25, http2=True, stats=None, limiter=None, single_flight=None):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        super().__init__(
+            endpoint_uri,
+            request_kwargs={"timeout": timeout},
+            session=session,
+            exception_retry_configuration=None,
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = stats or RpcStats()
+        self.limiter = limiter
+        self.single_flight = single_flight
+
+        self._http2_client = None
+        if http2 and HTTP2_AVAILABLE:
+            self._http2_client = httpx.Client(
+                http2=True,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+
+    def _post(self, request_data):
+        if self._http2_client is not None:
+            response = self._http2_client.post(
+                self.endpoint_uri, content=request_data, headers=self.get_request_headers()
+            )
+            response.raise_for_status()
+            return response.content
+        return self._request_session_manager.make_post_request(
+            self.endpoint_uri, request_data, **self.get_request_kwargs()
+        )
+
+    def _timed_post(self, label, request_data, attempts, cost=1):
+        for i in range(attempts):
+            if self.limiter is not None:
+                self.limiter.acquire(cost)
+            start = time.perf_counter()
+            try:
+                raw = self._post(request_data)
+                self.stats.record(label, time.perf_counter() - start)
+                return raw
+            except RETRY_ERRORS:
+                self.stats.record(label, time.perf_counter() - start, error=True)
+                if i == attempts - 1:
+                    raise
+                time.sleep(self.backoff * 2**i)
+
+    def make_request(self, method, params):
+        if self.single_flight is None or method not in READ_METHODS:
+            return super().make_request(method, params)
+        key = (method, json.dumps(params, sort_keys=True, default=repr))
+        return self.single_flight.do(key, lambda: super(PooledHTTPProvider, self).make_request(method, params))
+
+    def _make_request(self, method, request_data):
+        attempts = self.retries + 1 if method in READ_METHODS else 1
+        return self._timed_post(method, request_data, attempts)
+
+    def make_batch_request(self, batch_requests):
+        methods = {method for method, _ in batch_requests}
+        attempts = self.retries + 1 if methods <= READ_METHODS else 1
+        request_data = self.encode_batch_rpc_request(batch_requests)
+        raw_response = self._timed_post(
+            f"batch[{len(batch_requests)}]", request_data, attempts, cost=len(batch_requests)
+        )
+        response = self.decode_rpc_response(raw_response)
+        if not isinstance(response, list):
+            # RPC error ก้อนเดียว (เช่น endpoint ไม่รับ batch)
+            return response
+        return sorted(response, key=lambda r: r.get("id") or 0)
+
+
+def rate_limiter(endpoint_uri, rate, burst, limit_dir):
+    """TokenBucket ของ host นี้ (ไฟล์เดียวกัน = ถังเดียวกันทุก process ที่ยิง host นี้)"""
+    host = urlparse(endpoint_uri).netloc.replace(":", "_") or "rpc"
+    return TokenBucket(os.path.join(limit_dir, f"{host}.bucket"), rate, burst)
+
+
+def make_provider(endpoint_uri, pool_size=20, timeout=10, retries=2, http2=True, stats=None,
+                  rate=0, burst=20, limit_dir=None, coalesce=True):
+    """สร้าง provider ที่ตั้งค่า pool / timeout / retry แล้ว
+
+    rate > 0 → จำกัด request/วินาที ต่อ host รวมทุก process (สถานะถังอยู่ใน limit_dir)
+    """
+    limiter = None
+    if rate > 0 and limit_dir:
+        limiter = rate_limiter(endpoint_uri, rate, burst, limit_dir)
+    return PooledHTTPProvider(
+        endpoint_uri,
+        pool_size=pool_size,
+        timeout=timeout,
+        retries=retries,
+        http2=http2,
+        stats=stats,
+        limiter=limiter,
+        single_flight=SingleFlight() if coalesce else None,
+    )
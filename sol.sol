@@ -51,91 +51,331 @@ contract EnergyMarket {
 
     enum Role { BUY_ONLY, SELL_ONLY, PROSUMER }
 
+    // ราคาเริ่มต้นต่อหน่วย (1 หน่วย = 1 Wh ตาม SCALE = 1000 ฝั่ง Python) = 1 PALM ต่อ kWh
+    uint256 public constant DEFAULT_PRICE = 10 ** 15;
+    // เพดานราคาที่ผู้ขาย/admin ตั้งได้ (1000 PALM ต่อ kWh) → net x ราคา และยอดรวมไม่ล้น uint256
+    uint256 public constant MAX_PRICE = 10 ** 18;
+
+    // 🔹 จัดให้ค่าที่ reportEnergy แก้ทุกรอบอยู่ใน slot เดียว (1+1+14+14 = 30 byte) → SSTORE ครั้งเดียวต่อรายงาน
+    // slot 2 = ราคา + จุดตัดยอดของตัวสะสม (_settle เขียนพร้อมกันใน SSTORE เดียว)
+    // uint112 ≈ 5.2e33 เหลือเฟือสำหรับ Wh และราคา (wei ต่อ Wh), uint144 ของตัวสะสมเต็มหลัง payEnergy ~1e25 ครั้ง
     struct Household {
         Role role;
-        uint256 energyGenerated;
-        uint256 energyConsumed;
         bool exists;
+        uint112 energyGenerated;
+        uint112 energyConsumed;
+        uint112 pricePerKwh;
+        uint144 accCheckpoint;
     }
 
-    mapping(address => Household) public households;
-    address[] public householdList;
+    mapping(address => Household) private _households;
+    address[] private _householdList;
+
+    // 🔹 ยอดรวมของทุกบ้านที่เหลือขาย (generated - consumed) และมูลค่าตามราคาของแต่ละบ้าน
+    // อัปเดตทุกครั้งที่ค่าของบ้านเปลี่ยน → payEnergy ไม่ต้องวน householdList เพื่อหายอดรวม
+    uint256 public totalSurplus;
+    uint256 public totalSurplusValue;
+
+    // 🔹 รายได้ผู้ขายแบบ pull: payEnergy แค่เพิ่มตัวสะสม "kWh ที่ขายได้ต่อ kWh ที่มีขาย"
+    // ส่วนแบ่งของแต่ละบ้าน = net x ราคา x (ตัวสะสมตอนนี้ - ตอนที่ตัดยอดล่าสุด) → ถอนด้วย claim() / claimFor()
+    uint256 private constant ACC_SCALE = 1e18;
+    uint256 public accSoldPerSurplus;
+    mapping(address => uint256) private _credited;
+
+    // 🔹 บ้านที่มีส่วนเกี่ยวกับการจ่ายเงินตอนนี้ = มี surplus หรือยังมีรายได้ค้างถอน (เพิ่ม/ลบ O(1) แบบ swap-and-pop)
+    // บ้าน BUY_ONLY ไม่เคยเข้า set → การกวาดรายได้ (claimFor) ไม่ต้องไล่ทุกบ้านใน householdList
+    address[] private _activeSellers;
+    mapping(address => uint256) private _sellerPos; // ตำแหน่งใน _activeSellers + 1 (0 = ไม่อยู่ใน set)
+
+    // 🔹 รายงานแบบรวมหลายบ้าน: บ้านเซ็น EnergyReport (EIP-712) นอก chain แล้ว relayer ส่งรวมใน tx เดียว
+    struct EnergyReport {
+        address house;
+        uint256 generated;
+        uint256 consumed;
+        uint256 interval;
+        uint256 nonce;
+    }
+
+    bytes32 private constant DOMAIN_TYPEHASH =
+        keccak256("EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)");
+    bytes32 private constant REPORT_TYPEHASH =
+        keccak256("EnergyReport(address house,uint256 generated,uint256 consumed,uint256 interval,uint256 nonce)");
+    // s ต้องอยู่ครึ่งล่างของ secp256k1n (EIP-2) กัน signature เดียวกันถูกดัดแปลงเป็นอีกแบบ
+    uint256 private constant SECP256K1N_HALF = 0x7FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF5D576E7357A4501DDFE92F46681B20A0;
+
+    bytes32 public immutable DOMAIN_SEPARATOR;
+    // nonce ล่าสุดที่ใช้แล้วของแต่ละบ้าน (รายงานใหม่ต้องใช้ nonce มากกว่านี้ → replay ไม่ได้)
+    mapping(address => uint256) public reportNonces;
 
     event HouseholdRegistered(address indexed user, Role role);
     event EnergyReported(address indexed user, uint256 generated, uint256 consumed);
     event EnergyReset(address indexed user);
     event EnergyPaid(address indexed buyer, uint256 kwh, uint256 pricePerKwh, uint256 totalCost);
+    event Claimed(address indexed house, uint256 amount);
+    event ReportRejected(address indexed house, uint256 nonce, string reason);
+
+    // 🔹 custom error แทน revert string (ไม่ต้องเก็บข้อความใน bytecode / ไม่ต้อง ABI-encode string ตอน revert)
+    // ชื่อ error ต้องตรงกับ MARKET_ABI ใน config.py → preflight แปลง selector กลับเป็นชื่อ
+    error OnlyAdmin();
+    error AlreadyRegistered();
+    error NotRegistered();
+    error NotAllowed();
+    error BuyerNotRegistered();
+    error NotAllowedToBuy();
+    error NothingToBuy();
+    error NoSellersAvailable();
+    error PaymentFailed();
+    error LengthMismatch();
+    error ValueTooLarge();
+    error PriceTooHigh();
 
     constructor(address tokenAddress) {
         token = Palm(tokenAddress);
         admin = msg.sender;
+        DOMAIN_SEPARATOR = keccak256(
+            abi.encode(DOMAIN_TYPEHASH, keccak256("EnergyMarket"), keccak256("1"), block.chainid, address(this))
+        );
     }
 
     function registerHousehold(address user, Role role) external {
-        require(msg.sender == admin, "Only admin can register");
-        require(!households[user].exists, "Already registered");
+        if (msg.sender != admin) revert OnlyAdmin();
+        if (_households[user].exists) revert AlreadyRegistered();
 
-        households[user] = Household(role, 0, 0, true);
-        householdList.push(user);
+        _households[user] = Household(role, true, 0, 0, uint112(DEFAULT_PRICE), uint144(accSoldPerSurplus));
+        _householdList.push(user);
 
         emit HouseholdRegistered(user, role);
     }
 
+    // 🔹 getter ตาม ABI ใน config.py
+    function households(address user) external view returns (uint256 generated, uint256 consumed, uint256 pricePerKwh) {
+        Household storage h = _households[user];
+        return (h.energyGenerated, h.energyConsumed, h.pricePerKwh);
+    }
+
+    function householdList() external view returns (address[] memory) {
+        return _householdList;
+    }
+
+    // 🔹 ผู้ขายตั้งราคาเอง (หรือ admin ตั้งให้)
+    function setPrice(address house, uint256 pricePerKwh) external {
+        Household storage h = _households[house];
+        if (!h.exists) revert NotRegistered();
+        if (msg.sender != house && msg.sender != admin) revert NotAllowed();
+        if (pricePerKwh > MAX_PRICE) revert PriceTooHigh();
+        _settle(house, h);
+        uint256 net = _surplus(h);
+        totalSurplusValue = totalSurplusValue - net * h.pricePerKwh + net * pricePerKwh;
+        h.pricePerKwh = uint112(pricePerKwh);
+    }
+
+    function getPrice(address house) external view returns (uint256 pricePerKwh) {
+        return _households[house].pricePerKwh;
+    }
+
+    function activeSellers() external view returns (address[] memory) {
+        return _activeSellers;
+    }
+
+    function activeSellerCount() external view returns (uint256) {
+        return _activeSellers.length;
+    }
+
+    function _addSeller(address house) private {
+        if (_sellerPos[house] == 0) {
+            _activeSellers.push(house);
+            _sellerPos[house] = _activeSellers.length;
+        }
+    }
+
+    function _removeSeller(address house) private {
+        uint256 pos = _sellerPos[house];
+        if (pos == 0) return;
+        uint256 last = _activeSellers.length;
+        if (pos != last) {
+            address moved = _activeSellers[last - 1];
+            _activeSellers[pos - 1] = moved;
+            _sellerPos[moved] = pos;
+        }
+        _activeSellers.pop();
+        delete _sellerPos[house];
+    }
+
+    function _surplus(Household storage h) private view returns (uint256) {
+        uint256 generated = h.energyGenerated;
+        uint256 consumed = h.energyConsumed;
+        return generated > consumed ? generated - consumed : 0;
+    }
+
+    // 🔹 ตัดยอดรายได้ที่สะสมจาก net x ราคาปัจจุบัน ก่อนค่าใดค่าหนึ่งจะเปลี่ยน
+    function _settle(address house, Household storage h) private {
+        uint256 acc = accSoldPerSurplus;
+        uint256 value = _surplus(h) * h.pricePerKwh;
+        if (value > 0) {
+            _credited[house] += (value * (acc - h.accCheckpoint)) / ACC_SCALE;
+        }
+        if (h.accCheckpoint != acc) {
+            h.accCheckpoint = uint144(acc);
+        }
+    }
+
+    // 🔹 เขียนค่าใหม่ของบ้าน + ปรับยอดรวมด้วยผลต่างของส่วนที่เหลือขาย (เก่า → ใหม่)
+    function _setEnergy(address house, Household storage h, uint256 generated, uint256 consumed) private {
+        if (generated > type(uint112).max || consumed > type(uint112).max) revert ValueTooLarge();
+        _settle(house, h);
+        uint256 oldNet = _surplus(h);
+        uint256 newNet = generated > consumed ? generated - consumed : 0;
+
+        h.energyGenerated = uint112(generated);
+        h.energyConsumed = uint112(consumed);
+
+        if (newNet != oldNet) {
+            uint256 price = h.pricePerKwh;
+            totalSurplus = totalSurplus - oldNet + newNet;
+            totalSurplusValue = totalSurplusValue - oldNet * price + newNet * price;
+
+            // set เปลี่ยนได้เฉพาะตอน surplus ข้ามศูนย์ (รายงานซ้ำของผู้ขาย / ผู้ซื้อไม่ต้องแตะ set)
+            if (oldNet == 0) {
+                _addSeller(house);
+            } else if (newNet == 0 && _credited[house] == 0) {
+                _removeSeller(house);
+            }
+        }
+    }
+
     function reportEnergy(uint256 generated, uint256 consumed) external {
-        require(households[msg.sender].exists, "Not registered");
+        Household storage h = _households[msg.sender];
+        if (!h.exists) revert NotRegistered();
 
-        households[msg.sender].energyGenerated = generated;
-        households[msg.sender].energyConsumed = consumed;
+        _setEnergy(msg.sender, h, generated, consumed);
 
         emit EnergyReported(msg.sender, generated, consumed);
     }
 
+    function _recover(bytes32 digest, bytes calldata sig) private pure returns (address) {
+        if (sig.length != 65) return address(0);
+        bytes32 r = bytes32(sig[0:32]);
+        bytes32 s = bytes32(sig[32:64]);
+        uint8 v = uint8(sig[64]);
+        if (uint256(s) > SECP256K1N_HALF) return address(0);
+        if (v < 27) v += 27;
+        return ecrecover(digest, v, r, s);
+    }
+
+    // 🔹 ใครส่งก็ได้ (relayer) แต่ค่าที่ใช้ต้องมาจากลายเซ็นของบ้านนั้นเอง
+    // รายงานที่ไม่ผ่าน → ข้ามพร้อม ReportRejected ไม่ทำให้บ้านอื่นใน batch ล้มตาม
+    function batchReport(EnergyReport[] calldata reports, bytes[] calldata sigs) external {
+        uint256 n = reports.length;
+        if (n != sigs.length) revert LengthMismatch();
+
+        for (uint256 i = 0; i < n; ) {
+            EnergyReport calldata rep = reports[i];
+            Household storage h = _households[rep.house];
+            if (!h.exists) {
+                emit ReportRejected(rep.house, rep.nonce, "Not registered");
+            } else if (rep.nonce <= reportNonces[rep.house]) {
+                emit ReportRejected(rep.house, rep.nonce, "Stale nonce");
+            } else if (_recover(_reportDigest(rep), sigs[i]) != rep.house) {
+                emit ReportRejected(rep.house, rep.nonce, "Bad signature");
+            } else if (rep.generated > type(uint112).max || rep.consumed > type(uint112).max) {
+                emit ReportRejected(rep.house, rep.nonce, "Value too large");
+            } else {
+                reportNonces[rep.house] = rep.nonce;
+                _setEnergy(rep.house, h, rep.generated, rep.consumed);
+
+                emit EnergyReported(rep.house, rep.generated, rep.consumed);
+            }
+            unchecked { ++i; }
+        }
+    }
+
+    function _reportDigest(EnergyReport calldata rep) private view returns (bytes32) {
+        bytes32 structHash = keccak256(
+            abi.encode(REPORT_TYPEHASH, rep.house, rep.generated, rep.consumed, rep.interval, rep.nonce)
+        );
+        return keccak256(abi.encodePacked("\x19\x01", DOMAIN_SEPARATOR, structHash));
+    }
+
     function resetEnergy() external {
-        require(households[msg.sender].exists, "Not registered");
+        Household storage h = _households[msg.sender];
+        if (!h.exists) revert NotRegistered();
 
-        households[msg.sender].energyGenerated = 0;
-        households[msg.sender].energyConsumed = 0;
+        _setEnergy(msg.sender, h, 0, 0);
 
         emit EnergyReset(msg.sender);
     }
 
-    function payEnergy(address buyer, uint256 kwh, uint256 pricePerKwh) external {
-    require(households[buyer].exists, "Buyer not registered");
-    require(
-        households[buyer].role == Role.BUY_ONLY ||
-        households[buyer].role == Role.PROSUMER,
-        "Not allowed to buy"
-    );
-
-    // 🔹 คำนวณรวมพลังงานที่เหลือขายก่อน
-    uint256 totalSell = 0;
-    for (uint i = 0; i < householdList.length; i++) {
-        Household storage h = households[householdList[i]];
-        if (h.energyGenerated > h.energyConsumed) {
-            totalSell += (h.energyGenerated - h.energyConsumed);
-        }
-    }
+    // 🔹 maxPricePerKwh = ราคาเฉลี่ยสูงสุดที่ผู้ซื้อยอมจ่าย (ราคาผู้ขายขึ้นหลังผู้ซื้อ approve ไว้ → revert ไม่ดึงเงินเกิน)
+    function payEnergy(address buyer, uint256 kwh, uint256 maxPricePerKwh) external {
+    // อ่าน role + exists จาก slot เดียวกันครั้งเดียว
+    Household storage b = _households[buyer];
+    if (!b.exists) revert BuyerNotRegistered();
+    if (b.role != Role.BUY_ONLY && b.role != Role.PROSUMER) revert NotAllowedToBuy();
+    if (kwh == 0) revert NothingToBuy();
+
+    // 🔹 รวมพลังงานที่เหลือขาย + มูลค่าตามราคาของแต่ละผู้ขาย (ยอดสะสม ไม่ต้องวนลูป)
+    uint256 totalSell = totalSurplus;
+    uint256 totalValue = totalSurplusValue;
 
     // ❌ ถ้าไม่มีผู้ขาย → ห้ามดึงเงิน
-    require(totalSell > 0, "No sellers available");
+    if (totalSell == 0) revert NoSellersAvailable();
 
     // 🔹 ซื้อได้แค่ตามพลังงานที่มีจริง
     uint256 actualKwh = kwh > totalSell ? totalSell : kwh;
-    uint256 totalCost = actualKwh * pricePerKwh;
+    // actualKwh * totalValue / totalSell แบบไม่ล้น: แยกส่วนเต็มกับเศษของราคาเฉลี่ย (actualKwh <= totalSell)
+    uint256 avgPrice = totalValue / totalSell;
+    uint256 totalCost = actualKwh * avgPrice + (actualKwh * (totalValue % totalSell)) / totalSell;
+    // ราคาผู้ขายไม่เกิน MAX_PRICE อยู่แล้ว → ค่าที่สูงกว่านั้นไม่จำกัด (และไม่ให้คูณล้น)
+    if (maxPricePerKwh < MAX_PRICE && totalCost > actualKwh * maxPricePerKwh) revert PriceTooHigh();
+
+    if (!token.transferFrom(buyer, address(this), totalCost)) revert PaymentFailed();
+
+    // 🔹 เครดิตให้ผู้ขายทุกรายตามสัดส่วนพลังงาน x ราคา (ผ่านตัวสะสม ไม่ต้องวนลูป / ไม่ transfer ทีละบ้าน)
+    accSoldPerSurplus += (actualKwh * ACC_SCALE) / totalSell;
+
+    emit EnergyPaid(buyer, actualKwh, totalCost / actualKwh, totalCost);
+}
 
-    require(token.transferFrom(buyer, address(this), totalCost), "Payment failed");
+    // 🔹 รายได้ที่ถอนได้ (ที่ตัดยอดแล้ว + ที่สะสมตั้งแต่ตัดยอดล่าสุด)
+    function claimable(address house) public view returns (uint256) {
+        Household storage h = _households[house];
+        uint256 pending = (_surplus(h) * h.pricePerKwh * (accSoldPerSurplus - h.accCheckpoint)) / ACC_SCALE;
+        return _credited[house] + pending;
+    }
 
-    // 🔹 แจกจ่ายโทเคนตามสัดส่วน
-    for (uint i = 0; i < householdList.length; i++) {
-        Household storage h = households[householdList[i]];
-        if (h.energyGenerated > h.energyConsumed) {
-            uint256 net = h.energyGenerated - h.energyConsumed;
-            uint256 payout = (totalCost * net) / totalSell;
-            token.transfer(householdList[i], payout);
+    function _claim(address house) private returns (uint256 amount) {
+        _settle(house, _households[house]);
+        amount = _credited[house];
+        if (amount > 0) {
+            _credited[house] = 0;
+            // ผู้รับรายไหน transfer ไม่ผ่าน → คืนยอดไว้ให้ถอนใหม่ ไม่ให้ค้างทั้ง batch
+            try token.transfer(house, amount) returns (bool ok) {
+                if (!ok) {
+                    _credited[house] = amount;
+                    return 0;
+                }
+            } catch {
+                _credited[house] = amount;
+                return 0;
+            }
+            emit Claimed(house, amount);
+            if (_surplus(_households[house]) == 0) {
+                _removeSeller(house);
+            }
         }
     }
 
-    emit EnergyPaid(buyer, actualKwh, pricePerKwh, totalCost);
-}
+    function claim() external returns (uint256) {
+        return _claim(msg.sender);
+    }
+
+    // 🔹 ใครก็กวาดรายได้ให้หลายบ้านได้ (โอนเข้ากระเป๋าของบ้านนั้นเสมอ)
+    function claimFor(address[] calldata houses) external {
+        uint256 n = houses.length;
+        for (uint256 i = 0; i < n; ) {
+            _claim(houses[i]);
+            unchecked { ++i; }
+        }
+    }
 
 }
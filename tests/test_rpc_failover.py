@@ -0,0 +1,160 @@
+"""FailoverProvider กับ JSON-RPC node ปลอม 2 ตัว (HTTPServer ในเครื่อง): ตัวหนึ่งล่ม อีกตัวใช้ได้
+
+    python -m pytest tests/
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from eth_account import Account
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rpc_failover import FailoverProvider, AsyncFailoverProvider  # noqa: E402
+
+
+class StubNode:
+    """node ปลอม: ตอบ eth_blockNumber = block, ตอบ method อื่นด้วย uri ของตัวเอง, status != 200 = ล่ม"""
+
+    def __init__(self, block=100):
+        self.block = block
+        self.status = 200
+        self.methods = []
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                requests = request if isinstance(request, list) else [request]
+                node.methods.extend(r["method"] for r in requests)
+                replies = [{"jsonrpc": "2.0", "id": r["id"], "result": node.result(r["method"])} for r in requests]
+                body = json.dumps(replies if isinstance(request, list) else replies[0]).encode()
+                self.send_response(node.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.uri = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def result(self, method):
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        return self.uri
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def nodes():
+    down, up = StubNode(), StubNode()
+    down.status = 503
+    yield down, up
+    down.close()
+    up.close()
+
+
+def _provider(nodes):
+    return FailoverProvider([node.uri for node in nodes], retries=0, http2=False)
+
+
+def test_read_fails_over_to_next_node(nodes):
+    down, up = nodes
+    provider = _provider(nodes)
+
+    assert provider.make_request("eth_chainId", [])["result"] == up.uri
+    assert down.methods == ["eth_chainId"]
+    assert not provider.endpoints[0].healthy
+    # node ที่ล่มถูกพักไว้ → request ถัดไปไปที่ node ที่ใช้ได้ก่อนเลย
+    provider.make_request("eth_gasPrice", [])
+    assert down.methods == ["eth_chainId"]
+    assert up.methods == ["eth_chainId", "eth_gasPrice"]
+
+
+def test_health_check_restores_node(nodes):
+    down, up = nodes
+    provider = _provider(nodes)
+    provider.check_health()
+    assert [ep.healthy for ep in provider.endpoints] == [False, True]
+
+    down.status = 200
+    provider.check_health()
+    assert [ep.healthy for ep in provider.endpoints] == [True, True]
+
+    # block ตามหลังเกิน max_block_lag → ไม่ใช้แม้จะตอบได้
+    down.block = up.block - provider.max_block_lag - 1
+    provider.check_health()
+    assert [ep.healthy for ep in provider.endpoints] == [False, True]
+
+
+def test_single_endpoint_recovers_through_health_check(nodes):
+    down, _ = nodes
+    provider = FailoverProvider([down.uri], retries=0, http2=False, health_interval=0.05)
+    with pytest.raises(Exception):
+        provider.make_request("eth_chainId", [])
+    assert not provider.endpoints[0].healthy
+
+    down.status = 200
+    provider.start()
+    try:
+        for _ in range(100):
+            if provider.endpoints[0].healthy:
+                break
+            time.sleep(0.05)
+    finally:
+        provider.stop()
+    assert provider.endpoints[0].healthy
+
+
+def test_writes_stay_pinned_per_sender(nodes):
+    down, up = nodes
+    down.status = 200
+    provider = _provider(nodes)
+    account = Account.create()
+    tx = account.sign_transaction({
+        "to": account.address, "value": 0, "gas": 21000, "gasPrice": 1, "nonce": 0, "chainId": 1,
+    })
+    raw = "0x" + tx.raw_transaction.hex()
+
+    first = provider.make_request("eth_sendRawTransaction", [raw])["result"]
+    pinned = provider.pinned(account.address)
+    assert first == pinned.uri
+    # node อื่นเร็วกว่าก็ยังส่งไป node เดิม (ลำดับ nonce ใน mempool ไม่สลับ)
+    other = next(ep for ep in provider.endpoints if ep is not pinned)
+    other.latency, pinned.latency = 0.001, 1.0
+    assert provider.make_request("eth_sendRawTransaction", [raw])["result"] == pinned.uri
+    assert provider.make_request("eth_chainId", [])["result"] == other.uri
+
+    # node ประจำล่ม → ย้ายไป node ที่ใช้ได้
+    (down if pinned.uri == down.uri else up).status = 503
+    assert provider.make_request("eth_sendRawTransaction", [raw])["result"] == other.uri
+    assert provider.pinned(account.address) is other
+
+
+def test_async_provider_shares_failover_state(nodes):
+    down, up = nodes
+    provider = _provider(nodes)
+    async_provider = AsyncFailoverProvider(provider, retries=0)
+
+    async def request():
+        try:
+            return await async_provider.make_request("eth_chainId", [])
+        finally:
+            await async_provider.disconnect()
+
+    response = asyncio.run(request())
+    assert response["result"] == up.uri
+    assert not provider.endpoints[0].healthy
+    assert provider.stats.snapshot()["eth_chainId"]["errors"] == 1
@@ -0,0 +1,157 @@
+"""เร่ง tx ที่ค้างใน mempool ด้วย replace-by-fee
+
+ตอน fee พุ่ง tx ที่ตั้งราคาไว้ตอน build จะค้าง และทุก tx ที่ nonce ถัดไปของ address เดียวกันต้องรอตาม
+watchdog นี้ดู tx ที่ค้างเกิน stuck_after วินาที แล้ว sign ใหม่ด้วย nonce เดิม + fee ที่สูงขึ้น (ไม่เกิน max_fee)
+hash ตัวใหม่ผูกกับ TxHandle เดิมผ่าน ReceiptTracker.replace() → ใครรอ handle อยู่ไม่ต้องรู้ว่ามีการส่งแทน
+"""
+import time
+import threading
+
+from fast_tx import sign_tx
+
+# node ส่วนใหญ่ (geth) รับ tx แทนที่เมื่อ fee สูงกว่าเดิมอย่างน้อย 10%
+MIN_BUMP = 1.1
+
+
+class _Pending:
+    __slots__ = ("handle", "call", "pk", "nonce", "gas", "fees", "sent_at", "bumps", "capped")
+
+    def __init__(self, handle, call, pk, nonce, gas, fees):
+        self.handle = handle
+        self.call = call
+        self.pk = pk
+        self.nonce = nonce
+        self.gas = gas
+        self.fees = dict(fees)
+        self.sent_at = time.monotonic()
+        self.bumps = 0
+        self.capped = False
+
+
+class TxAccelerator:
+    def __init__(self, web3, tracker, gas_oracle, chain_id, stuck_after=90, bump=1.125,
+                 max_fee=None, max_bumps=5, check_interval=10):
+        if bump < MIN_BUMP:
+            raise ValueError(f"bump ต้องไม่น้อยกว่า {MIN_BUMP}")
+        self.web3 = web3
+        self.tracker = tracker
+        self.gas_oracle = gas_oracle
+        self.chain_id = chain_id
+        self.stuck_after = stuck_after
+        self.bump = bump
+        self.max_fee = max_fee  # wei ต่อ gas สูงสุดที่ยอมจ่าย (None = ไม่จำกัด)
+        self.max_bumps = max_bumps
+        self.check_interval = check_interval
+        self.replaced = 0
+
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, handle, call, pk, nonce, gas, fees):
+        """จำข้อมูลที่ใช้ sign tx ไว้ เผื่อต้องส่งแทนด้วย fee สูงขึ้น"""
+        self._add(handle, _Pending(handle, call, pk, nonce, gas, fees))
+
+    def rewatch(self, old, new):
+        """เฝ้า tx เดิมต่อผ่าน handle ใหม่ (หลัง tracker หมดเวลาแล้ว retrack) → fee / จำนวนครั้งที่ส่งแทนนับต่อจากเดิม"""
+        entry = old.accel
+        if entry is None:
+            return
+        entry.handle = new
+        self._add(new, entry)
+
+    def _add(self, handle, entry):
+        handle.accel = entry
+        with self._lock:
+            self._watched[id(handle)] = entry
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        handle.add_done_callback(self._unwatch)
+
+    def _unwatch(self, handle):
+        with self._lock:
+            self._watched.pop(id(handle), None)
+
+    def replacements(self, handle):
+        """hash ที่ส่งแทน tx เดิมไปแล้ว (ไม่รวม hash แรก)"""
+        return handle.hashes[1:]
+
+    # -------------------------------
+    # คำนวณ fee ใหม่
+    # -------------------------------
+    def _bump(self, value):
+        # ปัดขึ้น กัน fee ต่ำกว่า MIN_BUMP เพราะปัดเศษ (ค่าน้อยๆ อย่าง tip)
+        return int(value * self.bump) + 1
+
+    def _cap(self, value):
+        return value if self.max_fee is None else min(value, self.max_fee)
+
+    def _bumped_fees(self, old):
+        """fee เดิม * bump หรือราคาตลาดตอนนี้ (เอาที่สูงกว่า) แต่ไม่เกิน max_fee → None ถ้าขยับไม่ได้แล้ว"""
+        current = self.gas_oracle.fee_params()
+        if "gasPrice" in old:
+            price = self._cap(max(self._bump(old["gasPrice"]), current.get("gasPrice", 0)))
+            if price < old["gasPrice"] * MIN_BUMP:
+                return None
+            return {"gasPrice": price}
+
+        max_fee = self._cap(max(self._bump(old["maxFeePerGas"]), current.get("maxFeePerGas", 0)))
+        tip = max(self._bump(old["maxPriorityFeePerGas"]), current.get("maxPriorityFeePerGas", 0))
+        tip = min(tip, max_fee)
+        if max_fee < old["maxFeePerGas"] * MIN_BUMP or tip < old["maxPriorityFeePerGas"] * MIN_BUMP:
+            return None
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": tip}
+
+    # -------------------------------
+    # Watchdog
+    # -------------------------------
+    def _accelerate(self, entry):
+        fees = self._bumped_fees(entry.fees)
+        if fees is None:
+            print(f"⛽ {entry.handle.label} ค้างอยู่แต่ fee ชนเพดานแล้ว → รอต่อ")
+            entry.capped = True
+            return
+
+        raw_tx = sign_tx(entry.call, entry.pk, self.chain_id, entry.nonce, entry.gas, fees)
+        entry.sent_at = time.monotonic()
+        try:
+            new_hash = self.web3.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            msg = str(e).lower()
+            if "nonce too low" in msg or "already known" in msg:
+                # tx เดิมถูก mine ไปแล้ว / node มีตัวนี้แล้ว → ให้ tracker ปิด handle เอง
+                return
+            print(f"⚠️ ส่ง tx แทน {entry.handle.label} ไม่สำเร็จ: {e}")
+            return
+
+        entry.fees = fees
+        entry.bumps += 1
+        self.replaced += 1
+        self.tracker.replace(entry.handle, new_hash)
+        print(f"🚀 {entry.handle.label} nonce={entry.nonce} ส่งแทนครั้งที่ {entry.bumps} "
+              f"fee={fees} tx={self.web3.to_hex(new_hash)}")
+
+    def check_once(self):
+        now = time.monotonic()
+        with self._lock:
+            stuck = [
+                e for e in self._watched.values()
+                if now - e.sent_at >= self.stuck_after and not e.capped and e.bumps < self.max_bumps
+            ]
+        for entry in stuck:
+            if not entry.handle.done():
+                self._accelerate(entry)
+        return len(stuck)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._watched:
+                    self._thread = None
+                    return
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"⚠️ tx accelerator: {e}")
+            time.sleep(self.check_interval)
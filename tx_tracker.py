@@ -0,0 +1,199 @@
+import time
+import threading
+from concurrent.futures import Future
+
+from web3.exceptions import TransactionNotFound, TimeExhausted
+# แปลง receipt ดิบจาก batch ให้เหมือนที่ eth.get_transaction_receipt คืน (HexBytes / int / AttributeDict)
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+
+
+class TxHandle(Future):
+    """Future ของ tx ที่ส่งไปแล้ว → result() คือ receipt เมื่อ tx ถูก mine"""
+
+    def __init__(self, tx_hash, label="", house=None, fn=None):
+        super().__init__()
+        self.tx_hash = tx_hash
+        self.label = label
+        self.house = house
+        self.fn = fn
+        self.submitted_at = time.monotonic()
+        self.seen_at = None  # เวลาที่ node ตอบว่ารู้จัก tx นี้ครั้งแรก
+        self.gas_limit = None
+        # hash ทุกตัวที่ใช้ nonce เดียวกัน (ตัวแรก + ตัวที่ส่งแทนด้วย fee สูงกว่า)
+        self.hashes = [tx_hash]
+        self.accel = None  # ข้อมูลที่ TxAccelerator ใช้ sign tx แทน (ตั้งใน TxAccelerator.watch)
+
+
+class ReceiptTracker:
+    """thread เดียวคอยเช็ค receipt ของทุก tx ที่ค้างอยู่พร้อมกัน (batch ต่อ block ใหม่)"""
+
+    def __init__(self, web3, poll_interval=2, timeout=600, latency=None):
+        self.web3 = web3
+        self.latency = latency  # LatencyRegistry → บันทึกช่วง first_seen / mined
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._batch_supported = True
+        # มี tx ใหม่ที่ยังไม่เคยเช็ค (อาจถูก mine ไปก่อน track() ใน block ปัจจุบันแล้ว)
+        self._unchecked = False
+
+    def track(self, tx_hash, label="", house=None, fn=None):
+        """ฝาก tx ไว้ให้ tracker ตามผล แล้วคืน TxHandle ทันที (ไม่ block)
+
+        tx ที่ตามอยู่แล้ว (เช่น batchReport เดียวที่หลายบ้านรอใน process เดียวกัน) → ได้ handle เดิม
+        """
+        handle = TxHandle(self._hex(tx_hash), label, house, fn)
+        with self._lock:
+            if handle.tx_hash in self._pending:
+                return self._pending[handle.tx_hash]
+            self._pending[handle.tx_hash] = handle
+            self._unchecked = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return handle
+
+    def _hex(self, tx_hash):
+        # hash จาก DB / JSON เป็น hex string อยู่แล้ว
+        return tx_hash if isinstance(tx_hash, str) else self.web3.to_hex(tx_hash)
+
+    def retrack(self, handle):
+        """ตามต่อ tx ของ handle ที่หมดเวลาไปแล้ว (ทุก hash รวมตัวที่ส่งแทน) → TxHandle ใหม่ที่นับเวลาใหม่"""
+        new = TxHandle(handle.tx_hash, handle.label, handle.house, handle.fn)
+        new.hashes = list(handle.hashes)
+        new.gas_limit = handle.gas_limit
+        new.seen_at = handle.seen_at
+        with self._lock:
+            for h in new.hashes:
+                self._pending[h] = new
+            self._unchecked = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return new
+
+    def replace(self, handle, new_hash):
+        """ผูก tx ที่ส่งแทน (nonce เดิม fee สูงกว่า) เข้ากับ handle เดิม → ตัวไหนถูก mine ก็ resolve handle นี้"""
+        new_hash = self._hex(new_hash)
+        with self._lock:
+            if handle.done() or new_hash in handle.hashes:
+                return
+            handle.hashes.append(new_hash)
+            self._pending[new_hash] = handle
+            self._unchecked = True
+        self._wakeup.set()
+
+    def _forget(self, handle):
+        for h in handle.hashes:
+            self._pending.pop(h, None)
+
+    def pending_count(self):
+        with self._lock:
+            return len({id(h) for h in self._pending.values()})
+
+    # -------------------------------
+    # Polling
+    # -------------------------------
+    def _mined_receipts(self, hashes, unseen=()):
+        """คืน ({hash: receipt ที่ถูก mine แล้ว}, hash ใน unseen ที่ node รู้จักแล้ว) จาก JSON-RPC batch เดียว"""
+        if self._batch_supported:
+            try:
+                responses = self.web3.provider.make_batch_request(
+                    [("eth_getTransactionReceipt", [h]) for h in hashes]
+                    + [("eth_getTransactionByHash", [h]) for h in unseen]
+                )
+            except Exception as e:
+                if "batch" in str(e).lower():
+                    # provider บอกเองว่าไม่รับ batch → ไม่ต้องลองอีก
+                    self._batch_supported = False
+                responses = None
+            if isinstance(responses, list):
+                receipts, txs = responses[:len(hashes)], responses[len(hashes):]
+                return (
+                    {h: AttributeDict.recursive(receipt_formatter(r["result"])) for h, r in zip(hashes, receipts) if r.get("result")},
+                    [h for h, r in zip(unseen, txs) if r.get("result")],
+                )
+            if responses is not None:
+                # endpoint ตอบ error ก้อนเดียวแทน list = ไม่รองรับ batch (เหมือน ReadBatch)
+                self._batch_supported = False
+        # ไม่มี batch (หรือ batch รอบนี้พลาดชั่วคราว) → เช็คทีละ hash แทน (ไม่วัด first_seen เพื่อไม่ให้ RPC เพิ่ม)
+        receipts = {h: self._receipt_or_none(h) for h in hashes}
+        return {h: r for h, r in receipts.items() if r is not None}, []
+
+    def _receipt_or_none(self, tx_hash):
+        try:
+            return self.web3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+
+    def _resolve(self, handle, receipt):
+        # tx ที่ถูก mine จริงอาจเป็นตัวที่ส่งแทน
+        handle.tx_hash = self.web3.to_hex(receipt["transactionHash"])
+        latency = time.monotonic() - handle.submitted_at
+        if self.latency is not None:
+            self.latency.record(handle.house, "mined", latency, handle.fn)
+        icon = "⛓️" if receipt["status"] == 1 else "❌"
+        print(f"{icon} {handle.label} tx={handle.tx_hash} ยืนยันใน {latency:.1f}s (block {receipt['blockNumber']})")
+        handle.set_result(receipt)
+
+    def _poll_once(self):
+        with self._lock:
+            hashes = list(self._pending)
+            unseen = []
+            if self.latency is not None:
+                unseen = [h.tx_hash for h in set(self._pending.values()) if h.seen_at is None]
+            self._unchecked = False
+        if not hashes:
+            return
+
+        mined, seen = self._mined_receipts(hashes, unseen)
+        now = time.monotonic()
+        for h in seen:
+            handle = self._pending.get(h)
+            if handle and handle.seen_at is None:
+                handle.seen_at = now
+                self.latency.record(handle.house, "first_seen", now - handle.submitted_at, handle.fn)
+
+        for h, receipt in mined.items():
+            with self._lock:
+                handle = self._pending.get(h)
+                if handle:
+                    self._forget(handle)
+            if handle:
+                self._resolve(handle, receipt)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = {id(h): h for h in self._pending.values() if now - h.submitted_at > self.timeout}
+            expired = list(expired.values())
+            for handle in expired:
+                self._forget(handle)
+        for handle in expired:
+            handle.set_exception(TimeExhausted(
+                f"tx {handle.tx_hash} ยังไม่ถูก mine หลัง {self.timeout}s"
+            ))
+
+    def _run(self):
+        last_block = None
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+            try:
+                block = self.web3.eth.block_number
+                if block != last_block or self._unchecked:
+                    self._poll_once()
+                    last_block = block
+            except Exception as e:
+                print(f"⚠️ receipt tracker: {e}")
+            self._expire()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()